@@ -1,6 +1,7 @@
 import requests
 import json
 import os
+import time
 
 # Base URL for the API
 BASE_URL = 'http://localhost:8000'
@@ -24,6 +25,28 @@ def test_prediction():
         print(f"Error testing prediction endpoint: {str(e)}")
         return None
 
+def test_batch_prediction():
+    """Test the batch prediction endpoint with inline column-oriented rows"""
+    try:
+        # Prepare the request from the test data columns
+        with open(os.path.join('testdata', 'testdata.csv'), 'r') as f:
+            header, *rows = [line.strip().split(',') for line in f if line.strip()]
+        columns = ['lastmonth_activity', 'lastyear_activity', 'number_of_employees']
+        data = {col: [float(row[header.index(col)]) for row in rows] for col in columns}
+        
+        # Make the request
+        response = requests.post(f'{BASE_URL}/prediction/batch', json=data)
+        
+        # Print results
+        print("\nBatch Prediction Endpoint:")
+        print(f"Status Code: {response.status_code}")
+        print(f"Response: {json.dumps(response.json(), indent=2)}")
+        
+        return response.json()
+    except Exception as e:
+        print(f"Error testing batch prediction endpoint: {str(e)}")
+        return None
+
 def test_scoring():
     """Test the scoring endpoint"""
     try:
@@ -59,7 +82,13 @@ def test_summary_stats():
 def test_diagnostics():
     """Test the diagnostics endpoint"""
     try:
-        # Make the request
+        # Start a diagnostics run and poll it until it finishes
+        job = requests.post(f'{BASE_URL}/diagnostics').json()
+        while job['status'] == 'running':
+            time.sleep(1)
+            job = requests.get(f"{BASE_URL}/diagnostics/{job['job_id']}").json()
+        
+        # Fetch the latest diagnostics
         response = requests.get(f'{BASE_URL}/diagnostics')
         
         # Print results
@@ -1,23 +1,67 @@
-from flask import Flask, session, jsonify, request
-import pandas as pd
+from flask import Flask, jsonify, request
 import numpy as np
-import pickle
-import json
 import os
+from datetime import datetime, timezone
 import diagnostics
-import reporting
+from jobs import JobRunner
+from metricstore import metrics_store, rollup_resolutions
+from versions import deployed_file
+from settings import load_config
 
 ######################Set up variables for use in our script
 app = Flask(__name__)
 app.secret_key = '1652d576-484a-49fd-913a-6879acfa6ba4'
 
-with open('config.json','r') as f:
-    config = json.load(f) 
+config = load_config()
 
 dataset_csv_path = os.path.join(config['output_folder_path']) 
 test_data_path = os.path.join(config['test_data_path'])
 model_path = os.path.join(config['output_model_path'])
 prod_deployment_path = os.path.join(config['prod_deployment_path'])
+feature_columns = config['numeric_columns']
+
+# Diagnostics retrain the model and query pip, so they run as background jobs
+diagnostics_jobs = JobRunner(diagnostics.collect_diagnostics)
+# Buckets returned per page of metric history
+history_page_size = 100
+history_max_page_size = 1000
+
+#######################Decode inline feature rows
+def decode_feature_rows():
+    """Decode the request body into an (n, features) float64 array without a DataFrame.
+
+    Accepts either column-oriented JSON ({column: [values]}) or a raw
+    little-endian float64 buffer in row-major (n, features) layout.
+    """
+    if request.mimetype == 'application/octet-stream':
+        buffer = request.get_data()
+        row_size = 8 * len(feature_columns)
+        if not buffer:
+            raise ValueError('Request body is empty')
+        if len(buffer) % row_size:
+            raise ValueError(f'Buffer size must be a multiple of {row_size} bytes')
+        return np.frombuffer(buffer, dtype='<f8').reshape(-1, len(feature_columns))
+    
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise ValueError('Request body must be a JSON object of {column: [values]}')
+    missing = [col for col in feature_columns if col not in payload]
+    if missing:
+        raise ValueError(f'Missing columns: {missing}')
+    columns = []
+    for col in feature_columns:
+        try:
+            values = np.asarray(payload[col], dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f'Column {col} must be a list of numbers')
+        if values.ndim != 1:
+            raise ValueError(f'Column {col} must be a flat list of numbers')
+        columns.append(values)
+    if len(set(len(col) for col in columns)) > 1:
+        raise ValueError('All columns must have the same length')
+    if not len(columns[0]):
+        raise ValueError('No rows to score')
+    return np.column_stack(columns)
 
 #######################Prediction Endpoint
 @app.route("/prediction", methods=['POST','OPTIONS'])
@@ -34,12 +78,32 @@ def predict():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+#######################Batch Prediction Endpoint
+@app.route("/prediction/batch", methods=['POST','OPTIONS'])
+def predict_batch():
+    # Score feature rows sent inline with the request
+    try:
+        X = decode_feature_rows()
+        predictions, probabilities = diagnostics.predict_array(X)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Binary clients get (n, 2) little-endian float64 rows of [prediction, probability]
+    if request.accept_mimetypes.best == 'application/octet-stream':
+        result = np.column_stack([predictions, probabilities]).astype('<f8')
+        return app.response_class(result.tobytes(), mimetype='application/octet-stream'), 200
+    
+    return jsonify({
+        'predictions': predictions.tolist(),
+        'probabilities': probabilities.tolist()
+    }), 200
+
 #######################Scoring Endpoint
 @app.route("/scoring", methods=['GET','OPTIONS'])
 def scoring():        
     # Get the F1 score from the latestscore.txt file
     try:
-        with open(os.path.join(prod_deployment_path, 'latestscore.txt'), 'r') as f:
+        with open(deployed_file('latestscore.txt'), 'r') as f:
             score = float(f.read())
         return jsonify({'f1_score': score}), 200
     except Exception as e:
@@ -55,27 +119,89 @@ def summary_stats():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-#######################Diagnostics Endpoint
+#######################Diagnostics Endpoints
+@app.route("/diagnostics", methods=['POST'])
+def start_diagnostics():
+    # Start a diagnostics run, or attach to the one already running
+    job = diagnostics_jobs.submit()
+    return jsonify(job), 202
+
 @app.route("/diagnostics", methods=['GET','OPTIONS'])
 def diagnostics_endpoint():        
-    # Get all diagnostics
+    # Serve the latest finished diagnostics along with any run in progress; reading
+    # never starts a run, only POST /diagnostics does
+    latest = diagnostics_jobs.latest()
+    running = diagnostics_jobs.running()
+    if latest is None:
+        if running is None:
+            return jsonify({'error': 'No diagnostics yet; POST /diagnostics to start a run',
+                            'running': None}), 404
+        # First run still going: tell the client to poll it
+        return jsonify({'running': running}), 202
+    
+    result = latest.pop('result') or {}
+    return jsonify({**result, 'job': latest, 'running': running}), 200
+
+@app.route("/diagnostics/<job_id>", methods=['GET'])
+def diagnostics_job(job_id):
+    # Poll a single diagnostics run
+    job = diagnostics_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Unknown job {job_id}'}), 404
+    return jsonify(job), 200
+
+#######################Metrics History Endpoints
+def parse_time(value):
+    """Parse a query time given as epoch seconds or an ISO 8601 string; None when absent."""
+    if value is None:
+        return None
     try:
-        # Get execution times
-        times = diagnostics.execution_time()
-        
-        # Get missing data percentages
-        missing_data = diagnostics.missing_data()
-        
-        # Get outdated packages
-        packages = diagnostics.outdated_packages_list()
-        
-        return jsonify({
-            'execution_times': times,
-            'missing_data_percentages': missing_data,
-            'outdated_packages': packages
-        }), 200
-    except Exception as e:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def bucket_time(bucket):
+    return datetime.fromtimestamp(bucket, timezone.utc).isoformat()
+
+@app.route("/metrics/history", methods=['GET','OPTIONS'])
+def metrics_series():
+    # List every metric series with history and the days it covers
+    series = [dict(entry, first=bucket_time(entry['first']), last=bucket_time(entry['last']),
+                   model_type=entry['model_type'] or None, feature=entry['feature'] or None)
+              for entry in metrics_store.series()]
+    return jsonify({'series': series, 'intervals': list(rollup_resolutions)}), 200
+
+@app.route("/metrics/history/<metric>", methods=['GET','OPTIONS'])
+def metrics_history(metric):
+    # Serve one page of hourly or daily min/mean/max of a metric from the rollups
+    try:
+        interval = request.args.get('interval', 'hour')
+        if interval not in rollup_resolutions:
+            raise ValueError(f'interval must be one of {list(rollup_resolutions)}')
+        limit = min(int(request.args.get('limit', history_page_size)), history_max_page_size)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        cursor = request.args.get('cursor')
+        buckets = metrics_store.history(
+            metric, interval,
+            model_type=request.args.get('model_type'), feature=request.args.get('feature'),
+            start=parse_time(request.args.get('start')), end=parse_time(request.args.get('end')),
+            after=int(cursor) if cursor is not None else None,
+            # One bucket past the page tells whether there is a next one
+            limit=limit + 1
+        )
+    except ValueError as e:
         return jsonify({'error': str(e)}), 400
+    
+    next_cursor = buckets[limit - 1]['bucket'] if len(buckets) > limit else None
+    return jsonify({
+        'metric': metric,
+        'model_type': request.args.get('model_type'),
+        'interval': interval,
+        'buckets': [{'start': bucket_time(bucket['bucket']), 'count': bucket['count'], 'mean': bucket['mean'],
+                     'min': bucket['min'], 'max': bucket['max']} for bucket in buckets[:limit]],
+        'next_cursor': next_cursor
+    }), 200
 
 if __name__ == "__main__":    
     app.run(host='127.0.0.1', port=8000, debug=True, threaded=True)
@@ -0,0 +1,59 @@
+import os
+import hashlib
+from collections import namedtuple
+
+
+
+##################Identity of files on disk
+def file_fingerprint(file_path, previous=None):
+    """Return size, mtime and content hash of a file.
+
+    The file is only hashed when its size or mtime differ from the previous
+    fingerprint, so unchanged files cost a single stat call.
+    """
+    stat = os.stat(file_path)
+    if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime_ns:
+        return previous
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest.hexdigest()}
+
+
+class ChangeSet(namedtuple('ChangeSet', ['added', 'modified', 'removed', 'fingerprints'])):
+    """Files added, modified and removed since a manifest, with every current file's fingerprint."""
+    __slots__ = ()
+
+    def __bool__(self):
+        return bool(self.added or self.modified or self.removed)
+
+
+def detect_changes(folder, previous, suffix='.csv'):
+    """Compare the files in folder with the fingerprints of a previous manifest.
+
+    Files are stat'ed first and hashed only when their size or mtime moved,
+    so an unchanged folder costs one stat per file. A previous entry of None
+    marks a file known only by name, which counts as unchanged.
+    """
+    files = sorted(file for file in os.listdir(folder) if file.endswith(suffix))
+    fingerprints = {file: file_fingerprint(os.path.join(folder, file), previous.get(file)) for file in files}
+    return compare_fingerprints(fingerprints, previous)
+
+
+def compare_fingerprints(fingerprints, previous):
+    """Return the ChangeSet between previous fingerprints and current ones."""
+    files = sorted(fingerprints)
+    added = [file for file in files if file not in previous]
+    modified = [file for file in files if previous.get(file) is not None
+                and fingerprints[file]['hash'] != previous[file]['hash']]
+    removed = [file for file in sorted(previous) if file not in fingerprints]
+    return ChangeSet(added, modified, removed, fingerprints)
+
+
+def file_stamp(path):
+    """Return inode, mtime and size of a file, which change whenever it is rewritten."""
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,435 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import importlib
+import tempfile
+import contextlib
+import subprocess
+import numpy as np
+from datetime import datetime
+
+import datagen
+import ingestion
+import training
+import tuning
+import versions
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+model_path = os.path.join(config['output_model_path'])
+prod_deployment_path = os.path.join(config['prod_deployment_path'])
+timing_history_file = os.path.join(model_path, 'timing_history.jsonl')
+# Where a benchmark worker leaves its JSON report, relative to its workspace
+worker_report_file = 'benchmark_report.json'
+scaling_history_file = os.path.join(model_path, 'scaling_history.jsonl')
+# Import-time budgets of the entry points that start often, checked by `benchmark.py startup`
+startup_budgets_ms = config.get('startup_budgets_ms', {'fullprocess': 300, 'daemon': 300})
+# Libraries the stages import lazily, loaded by the scaling worker before it times them
+lazy_libraries = ['sklearn.linear_model', 'sklearn.model_selection', 'sklearn.metrics', 'scipy.special',
+                  'scipy.stats', 'matplotlib.figure', 'matplotlib.backends.backend_agg', 'seaborn']
+
+
+##################Stages timed by diagnostics.execution_time
+def train_from_scratch():
+    """Run a full refit with a fresh hyperparameter search, as training does on new data."""
+    # Without this, every repetition after the first would reuse the leaderboard and time one fit
+    for path in (training.training_state_file, tuning.leaderboard_file):
+        if os.path.exists(path):
+            os.remove(path)
+    training.train_model()
+
+
+# Stages timed by diagnostics.execution_time, in the order they run. Ingestion is timed as
+# a full rebuild; both run in a scratch workspace, never on the live dataset or model
+timed_stages = {
+    'ingestion': lambda: ingestion.merge_multiple_dataframe(incremental=False),
+    'training': train_from_scratch
+}
+
+
+##################Helpers for memory measurement
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter for this process, where Linux allows it."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if os.uname().sysname == 'Darwin' else maxrss / 1024
+
+
+##################Function to time a stage in-process
+def time_stage(fn, repeat=5, warmup=1):
+    """Call fn warmup + repeat times and summarise wall time, CPU time and peak RSS."""
+    for _ in range(warmup):
+        fn()
+
+    reset_peak_rss()
+    wall_times, cpu_times = [], []
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        fn()
+        wall_times.append(time.perf_counter() - wall_start)
+        cpu_times.append(time.process_time() - cpu_start)
+
+    return {
+        'repeat': repeat,
+        'wall_min': min(wall_times),
+        'wall_median': float(np.median(wall_times)),
+        'wall_p95': float(np.percentile(wall_times, 95)),
+        'cpu_min': min(cpu_times),
+        'cpu_median': float(np.median(cpu_times)),
+        'cpu_p95': float(np.percentile(cpu_times, 95)),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+##################Function to benchmark the pipeline stages
+def run_timing(repeat=5, warmup=1, save=True):
+    """Time every stage in timed_stages and append the results to the timing history.
+
+    The stages run in a separate process on a scratch workspace whose
+    source folder links to the source files, so timing never rewrites the
+    live dataset, model or training state, and its output stays out of
+    this process.
+    """
+    workspace = tempfile.mkdtemp(prefix='pipeline-timing-')
+    try:
+        link_source_files(config['input_folder_path'], os.path.join(workspace, 'sourcedata'))
+        stages = run_in_workspace(workspace, 'time-worker',
+                                  options=['--repeat', str(repeat), '--warmup', str(warmup)])
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    record = {
+        'timestamp': datetime.now().isoformat(),
+        'deployed_version': versions.deployed_version(),
+        'stages': stages
+    }
+
+    if save:
+        os.makedirs(model_path, exist_ok=True)
+        with open(timing_history_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    return record
+
+
+def link_source_files(source_folder, target_folder):
+    """Fill target_folder with symlinks to the files of source_folder instead of copies."""
+    os.makedirs(target_folder)
+    for name in os.listdir(source_folder):
+        os.symlink(os.path.abspath(os.path.join(source_folder, name)), os.path.join(target_folder, name))
+
+
+def run_timing_worker(repeat=5, warmup=1):
+    """Time every stage in timed_stages in the current directory and write a JSON report."""
+    write_worker_report({name: time_stage(fn, repeat, warmup) for name, fn in timed_stages.items()})
+
+
+def load_timing_history():
+    try:
+        with open(timing_history_file, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+##################Functions to benchmark the full pipeline on synthetic data
+def run_in_workspace(workspace, command, options=(), **overrides):
+    """Run a benchmark worker command in a workspace and return the report it writes.
+
+    The workspace gets its own config.json with paths relative to it, so the
+    pipeline modules imported by the worker read and write only there. The
+    report goes to a file rather than stdout, which background threads of
+    the stages (such as the plot renderer) may still be printing to.
+    """
+    workspace_config = dict(config, input_folder_path='sourcedata',
+                            output_folder_path='ingesteddata', test_data_path='testdata',
+                            output_model_path='models', prod_deployment_path='production_deployment')
+    workspace_config.update(overrides)
+    with open(os.path.join(workspace, 'config.json'), 'w') as f:
+        json.dump(workspace_config, f, indent=4)
+
+    report_file = os.path.join(workspace, worker_report_file)
+    if os.path.exists(report_file):
+        os.remove(report_file)
+    subprocess.run([sys.executable, os.path.abspath(__file__), *options, command],
+                   cwd=workspace, capture_output=True, text=True, check=True)
+    with open(report_file, 'r') as f:
+        return json.load(f)
+
+
+def write_worker_report(report):
+    """Leave a worker's report in its workspace for run_in_workspace to read."""
+    with open(worker_report_file, 'w') as f:
+        json.dump(report, f)
+
+
+def run_scaling_worker():
+    """Run every fullprocess stage once in the current directory and write a JSON report.
+
+    Called in a fresh process whose working directory is a synthetic
+    workspace, so that each module picks up the workspace's config.json.
+    """
+    import scoring
+    import deployment
+    import diagnostics
+    import reporting
+
+    # Load the libraries the stages import lazily, so stage times measure only their work
+    for library in lazy_libraries:
+        importlib.import_module(library)
+
+    test_file = os.path.join(config['test_data_path'], 'testdata.csv')
+    stages = [
+        ('ingestion', ingestion.merge_multiple_dataframe),
+        ('training', training.train_model),
+        ('scoring', scoring.score_model),
+        ('deployment', deployment.store_model_into_pickle),
+        ('diagnostics', lambda: (diagnostics.model_predictions(test_file),
+                                 diagnostics.dataframe_summary(),
+                                 diagnostics.missing_data(),
+                                 diagnostics.data_drift_check())),
+        ('reporting', reporting.score_model)
+    ]
+
+    results = {}
+    for name, fn in stages:
+        reset_peak_rss()
+        with contextlib.redirect_stdout(io.StringIO()):
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            fn()
+            results[name] = {
+                'wall': time.perf_counter() - wall_start,
+                'cpu': time.process_time() - cpu_start,
+                'peak_rss_mb': peak_rss_mb()
+            }
+
+    write_worker_report(results)
+
+
+def run_scaling(row_counts, files=10, seed=0, test_rows=None, workdir=None, save=True):
+    """Benchmark the pipeline on synthetic datasets of each size in row_counts.
+
+    Every size gets its own workspace with generated sourcedata and testdata,
+    and runs in a separate process so its peak memory is measured alone.
+    """
+    cleanup = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='pipeline-scaling-')
+    records = []
+
+    try:
+        for rows in row_counts:
+            workspace = os.path.join(workdir, f'rows{rows}')
+            shutil.rmtree(workspace, ignore_errors=True)
+            n_test = test_rows or max(rows // 10, 1)
+
+            # Generate the source files and a test set with a different seed
+            datagen.generate_datasets(os.path.join(workspace, 'sourcedata'), rows, files, seed)
+            test_dir = os.path.join(workspace, 'testdata')
+            datagen.generate_datasets(test_dir, n_test, 1, seed + 1, prefix='testdata')
+            os.replace(os.path.join(test_dir, 'testdata0.csv'), os.path.join(test_dir, 'testdata.csv'))
+
+            stages = run_in_workspace(workspace, 'scale-worker')
+
+            # Stages that work on the whole dataset versus the test set
+            for name, stats in stages.items():
+                stage_rows = n_test if name in ('scoring', 'deployment', 'reporting') else rows
+                stats['rows'] = stage_rows
+                stats['rows_per_second'] = stage_rows / stats['wall'] if stats['wall'] else None
+
+            records.append({
+                'timestamp': datetime.now().isoformat(),
+                'rows': rows,
+                'files': files,
+                'test_rows': n_test,
+                'seed': seed,
+                'stages': stages
+            })
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if save:
+        os.makedirs(model_path, exist_ok=True)
+        with open(scaling_history_file, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+    return records
+
+
+def run_ingestion_worker():
+    """Time one full ingestion rebuild in the current directory and write a JSON report."""
+    reset_peak_rss()
+    with contextlib.redirect_stdout(io.StringIO()):
+        wall_start = time.perf_counter()
+        ingestion.merge_multiple_dataframe(incremental=False)
+        wall = time.perf_counter() - wall_start
+
+    write_worker_report({'wall': wall, 'peak_rss_mb': peak_rss_mb()})
+
+
+def run_parallel_ingestion(file_counts, rows_per_file=200_000, workers=None, seed=0, workdir=None):
+    """Compare sequential and parallel ingestion for each number of source files."""
+    cleanup = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='pipeline-ingestion-')
+    records = []
+
+    try:
+        for files in file_counts:
+            workspace = os.path.join(workdir, f'files{files}')
+            shutil.rmtree(workspace, ignore_errors=True)
+            datagen.generate_datasets(os.path.join(workspace, 'sourcedata'),
+                                      rows_per_file * files, files, seed)
+
+            record = {'files': files, 'rows': rows_per_file * files, 'workers': workers}
+            for mode in ('in_memory', 'parallel'):
+                record[mode] = run_in_workspace(workspace, 'ingest-worker', ingestion_mode=mode,
+                                                output_folder_path=f'ingesteddata_{mode}',
+                                                ingestion_workers=workers)
+            record['speedup'] = record['in_memory']['wall'] / record['parallel']['wall']
+            records.append(record)
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return records
+
+
+##################Functions to benchmark interpreter startup
+def import_time(module):
+    """Import module in a fresh interpreter with -X importtime and return its timings.
+
+    Returns the cumulative import time of the module in ms and the
+    cumulative time of every module it pulled in, slowest first.
+    """
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    imports = {}
+    for line in output.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports[name.strip()] = int(cumulative) / 1000
+
+    total = imports.pop(module)
+    return total, sorted(imports.items(), key=lambda item: item[1], reverse=True)
+
+
+def run_startup(budgets=startup_budgets_ms, repeat=5):
+    """Measure the import time of every budgeted entry point, keeping the fastest of repeat runs."""
+    results = {}
+    for module, budget in budgets.items():
+        runs = [import_time(module) for _ in range(repeat)]
+        total, heaviest = min(runs, key=lambda run: run[0])
+        results[module] = {'import_ms': total, 'budget_ms': budget,
+                           'within_budget': total <= budget, 'heaviest': heaviest[:5]}
+    return results
+
+
+def print_startup(results):
+    for module, result in results.items():
+        status = 'ok' if result['within_budget'] else 'OVER BUDGET'
+        print(f"{module:>12}: {result['import_ms']:.1f}ms (budget {result['budget_ms']}ms) {status}")
+        for name, ms in result['heaviest']:
+            print(f"{'':>14}{name}: {ms:.1f}ms")
+
+
+def print_parallel_ingestion(records):
+    print(f"{'files':>6} {'rows':>12} {'sequential (s)':>15} {'parallel (s)':>13} {'speedup':>8}")
+    for record in records:
+        print(f"{record['files']:>6} {record['rows']:>12} {record['in_memory']['wall']:>15.3f} "
+              f"{record['parallel']['wall']:>13.3f} {record['speedup']:>7.2f}x")
+
+
+def print_scaling(records):
+    print(f"{'rows':>12} {'stage':>12} {'wall (s)':>10} {'rows/s':>14} {'peak RSS (MB)':>14}")
+    for record in records:
+        for name, stats in record['stages'].items():
+            print(f"{record['rows']:>12} {name:>12} {stats['wall']:>10.3f} "
+                  f"{stats['rows_per_second']:>14,.0f} {stats['peak_rss_mb']:>14.1f}")
+
+
+def print_timing(record, previous=None):
+    for name, stats in record['stages'].items():
+        line = (f"{name:>10}: wall min {stats['wall_min']:.4f}s  median {stats['wall_median']:.4f}s  "
+                f"p95 {stats['wall_p95']:.4f}s  cpu median {stats['cpu_median']:.4f}s  "
+                f"peak RSS {stats['peak_rss_mb']:.1f}MB")
+        if previous and name in previous['stages']:
+            before = previous['stages'][name]['wall_median']
+            line += f"  ({(stats['wall_median'] - before) / before:+.1%} vs {previous['timestamp']})"
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the pipeline stages in-process')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    subparsers = parser.add_subparsers(dest='command')
+
+    scale = subparsers.add_parser('scale', help='Benchmark every stage on synthetic datasets')
+    scale.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    scale.add_argument('--files', type=int, default=10)
+    scale.add_argument('--seed', type=int, default=0)
+    scale.add_argument('--test-rows', type=int, default=None)
+    scale.add_argument('--workdir', default=None, help='Keep the generated workspaces here')
+    subparsers.add_parser('scale-worker', help=argparse.SUPPRESS)
+    subparsers.add_parser('time-worker', help=argparse.SUPPRESS)
+
+    parallel = subparsers.add_parser('ingest-parallel', help='Compare sequential and parallel ingestion')
+    parallel.add_argument('--files', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parallel.add_argument('--rows-per-file', type=int, default=200_000)
+    parallel.add_argument('--workers', type=int, default=None)
+    parallel.add_argument('--seed', type=int, default=0)
+    parallel.add_argument('--workdir', default=None, help='Keep the generated workspaces here')
+    subparsers.add_parser('ingest-worker', help=argparse.SUPPRESS)
+
+    startup = subparsers.add_parser('startup', help='Check entry-point import times against their budgets')
+    startup.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'scale':
+        print_scaling(run_scaling(args.rows, args.files, args.seed, args.test_rows, args.workdir))
+    elif args.command == 'scale-worker':
+        run_scaling_worker()
+    elif args.command == 'time-worker':
+        run_timing_worker(args.repeat, args.warmup)
+    elif args.command == 'ingest-parallel':
+        print_parallel_ingestion(run_parallel_ingestion(args.files, args.rows_per_file,
+                                                        args.workers, args.seed, args.workdir))
+    elif args.command == 'ingest-worker':
+        run_ingestion_worker()
+    elif args.command == 'startup':
+        results = run_startup(repeat=args.repeat)
+        print_startup(results)
+        if not all(result['within_budget'] for result in results.values()):
+            sys.exit(1)
+    else:
+        history = load_timing_history()
+        record = run_timing(args.repeat, args.warmup)
+        print_timing(record, history[-1] if history else None)
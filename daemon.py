@@ -0,0 +1,184 @@
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import signal
+import struct
+import traceback
+from datetime import datetime
+
+import fullprocess
+from pipeline import PipelineContext
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+input_folder_path = config['input_folder_path']
+test_data_path = config['test_data_path']
+# 'inotify' watches the folders through the kernel, 'poll' compares stat snapshots
+# and 'auto' uses inotify where it is available
+watch_mode = config.get('watch_mode', 'auto')
+# A change is processed once no file has moved for this long, so half-written files are skipped
+debounce_seconds = config.get('watch_debounce_seconds', 2)
+poll_seconds = config.get('watch_poll_seconds', 5)
+
+watch_paths = [input_folder_path, test_data_path]
+
+# inotify event flags from <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+event_header = struct.Struct('iIII')
+
+
+
+##################Snapshot of the watched csv files
+def snapshot(paths=watch_paths):
+    """Return size and mtime of every csv file in the watched folders, from stat calls only."""
+    files = {}
+    for path in paths:
+        try:
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.name.endswith('.csv') and entry.is_file():
+                stat = entry.stat()
+                files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+##################Watchers that block until a watched folder changes
+class InotifyWatcher:
+    """Wait for file events in the watched folders through inotify, loaded with ctypes."""
+
+    def __init__(self, paths=watch_paths):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        for path in paths:
+            os.makedirs(path, exist_ok=True)
+            if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+
+    def wait(self, timeout=None):
+        """Block until a csv file changes or timeout seconds pass; return whether one changed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return False
+            if any(name.endswith(b'.csv') for name in self.read_events()):
+                return True
+
+    def read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names, offset = [], 0
+        while offset < len(data):
+            _, _, _, length = event_header.unpack_from(data, offset)
+            offset += event_header.size
+            names.append(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Wait for changes by comparing stat snapshots of the watched folders."""
+
+    def __init__(self, paths=watch_paths):
+        self.paths = paths
+        self.last = snapshot(paths)
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            remaining = poll_seconds if deadline is None else min(poll_seconds, deadline - time.monotonic())
+            time.sleep(max(remaining, 0))
+            current = snapshot(self.paths)
+            if current != self.last:
+                self.last = current
+                return True
+        return False
+
+    def close(self):
+        pass
+
+
+def make_watcher():
+    if watch_mode in ('auto', 'inotify'):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            if watch_mode == 'inotify':
+                raise
+            print(f"inotify unavailable ({e}), polling every {poll_seconds}s instead")
+    return PollingWatcher()
+
+
+def wait_until_stable(watcher):
+    """Wait until the watched files stop changing for debounce_seconds."""
+    while True:
+        before = snapshot()
+        if not watcher.wait(debounce_seconds) and snapshot() == before:
+            return before
+
+
+##################Daemon loop
+def run_pipeline(context):
+    try:
+        fullprocess.main(context=context)
+    except Exception:
+        # Keep serving; the next change retries the stages that failed
+        print(f"Pipeline run failed at {datetime.now().isoformat()}")
+        traceback.print_exc()
+
+
+def run_daemon():
+    """Run the pipeline now and again every time the watched folders change."""
+    # Stop cleanly on SIGTERM as on Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    # One context for the whole process keeps unchanged datasets and models in memory
+    context = PipelineContext()
+    watcher = make_watcher()
+    print(f"Watching {watch_paths} with {type(watcher).__name__}")
+
+    try:
+        processed = snapshot()
+        run_pipeline(context)
+        while True:
+            watcher.wait()
+            current = wait_until_stable(watcher)
+            if current == processed:
+                continue
+            print(f"\nChange detected in {watch_paths}")
+            run_pipeline(context)
+            processed = current
+    except KeyboardInterrupt:
+        print("Stopping daemon")
+    finally:
+        watcher.close()
+
+
+if __name__ == '__main__':
+    run_daemon()
@@ -0,0 +1,69 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+
+
+# Rows generated and written at a time, so memory stays flat for any row count
+chunk_rows = 1_000_000
+
+
+##################Function to generate synthetic client records
+def generate_rows(rng, n):
+    """Return n sourcedata-shaped rows drawn from rng."""
+    # Four-letter corporation codes, built from random bytes without a Python loop
+    letters = rng.integers(ord('a'), ord('z') + 1, size=(n, 4), dtype=np.uint8)
+    corporation = letters.view('S4').ravel().astype(str)
+
+    # Heavy-tailed activity counts similar to the real source files
+    lastmonth_activity = np.floor(rng.lognormal(5.5, 2.0, n)).astype(np.int64)
+    lastyear_activity = np.floor(rng.lognormal(4.5, 1.8, n)).astype(np.int64)
+    number_of_employees = np.floor(rng.lognormal(4.5, 1.5, n)).astype(np.int64) + 1
+
+    # Attrition depends on activity and size so the model has something to learn
+    logit = (0.4 * np.log1p(lastmonth_activity) - 0.3 * np.log1p(lastyear_activity)
+             - 0.2 * np.log1p(number_of_employees) + rng.normal(0, 1, n))
+    exited = (logit > np.median(logit)).astype(np.int64)
+
+    return pd.DataFrame({
+        'corporation': corporation,
+        'lastmonth_activity': lastmonth_activity,
+        'lastyear_activity': lastyear_activity,
+        'number_of_employees': number_of_employees,
+        'exited': exited
+    })
+
+
+def generate_datasets(output_dir, rows, files=1, seed=0, prefix='dataset'):
+    """Write `rows` rows split across `files` csv files and return their paths.
+
+    Each file has its own generator seeded from (seed, file index), so a
+    file's content depends only on the seed and its position.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for index in range(files):
+        rng = np.random.default_rng([seed, index])
+        file_rows = rows // files + (1 if index < rows % files else 0)
+        path = os.path.join(output_dir, f'{prefix}{index}.csv')
+
+        for start in range(0, max(file_rows, 1), chunk_rows):
+            n = min(chunk_rows, file_rows - start)
+            generate_rows(rng, n).to_csv(path, mode='w' if start == 0 else 'a',
+                                         header=start == 0, index=False)
+        paths.append(path)
+
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic sourcedata-shaped csv files')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='syntheticdata')
+    args = parser.parse_args()
+
+    paths = generate_datasets(args.output, args.rows, args.files, args.seed)
+    print(f"Wrote {args.rows} rows to {len(paths)} files in {args.output}")
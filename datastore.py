@@ -0,0 +1,262 @@
+import os
+from settings import load_config
+
+
+
+#############Load config.json and get path variables
+config = load_config()
+
+output_folder_path = config['output_folder_path']
+numeric_columns = config['numeric_columns']
+target_column = config['target_column']
+
+# Columnar format for the ingested dataset: 'parquet', 'feather' or 'csv'
+dataset_format = config.get('dataset_format', 'parquet')
+# Also write finaldata.csv next to the columnar file for older consumers
+export_csv = config.get('export_csv', True)
+
+file_extensions = {'parquet': '.parquet', 'feather': '.feather', 'csv': '.csv'}
+
+# Explicit dtypes of the dataset columns; features are floats so missing values fit
+column_dtypes = {**{col: 'float64' for col in numeric_columns}, target_column: 'int64'}
+
+
+
+#############Helpers for reading and writing tables
+def dataset_file(fmt=None):
+    """Return the path of the ingested dataset in the given (or configured) format."""
+    return os.path.join(output_folder_path, 'finaldata' + file_extensions[fmt or dataset_format])
+
+
+def typed(df):
+    """Give the feature and target columns their explicit dtypes."""
+    return df.astype({col: dtype for col, dtype in column_dtypes.items() if col in df.columns})
+
+
+def read_table(path, columns=None):
+    """Read a parquet, feather or csv file, optionally loading only some columns."""
+    import pandas as pd
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns)
+    if path.endswith('.feather'):
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def write_table(df, path):
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    elif path.endswith('.feather'):
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+
+
+
+#############Functions for the ingested dataset
+def dataset_exists():
+    return os.path.exists(dataset_file())
+
+
+def current_dataset_file():
+    """Return the dataset file to read, falling back to finaldata.csv if no columnar copy exists yet."""
+    path = dataset_file()
+    if not os.path.exists(path):
+        path = dataset_file('csv')
+    return path
+
+
+def load_dataset(columns=None):
+    """Load the ingested dataset, falling back to finaldata.csv if no columnar copy exists yet."""
+    return read_table(current_dataset_file(), columns=columns)
+
+
+def write_dataset(df):
+    """Write the ingested dataset in the configured format (and as csv when exported)."""
+    os.makedirs(output_folder_path, exist_ok=True)
+    df = typed(df)
+    write_table(df, dataset_file())
+    if export_csv and dataset_format != 'csv':
+        write_table(df, dataset_file('csv'))
+
+
+#############Appends to the csv export that can be undone
+def csv_append_marker():
+    return dataset_file('csv') + '.appending'
+
+
+def begin_csv_append():
+    """Record the size of the csv before rows are appended to it in place, and return it.
+
+    The size is also written to a marker file, so an append cut short even
+    by a crash is undone the next time the csv is appended to.
+    """
+    undo_interrupted_csv_append()
+    csv_file = dataset_file('csv')
+    offset = os.path.getsize(csv_file) if os.path.exists(csv_file) else 0
+    with open(csv_append_marker(), 'w') as f:
+        f.write(str(offset))
+    return offset
+
+
+def end_csv_append():
+    os.remove(csv_append_marker())
+
+
+def undo_csv_append(offset):
+    """Cut the csv back to its size before the append, dropping any partial rows."""
+    csv_file = dataset_file('csv')
+    if os.path.exists(csv_file):
+        with open(csv_file, 'r+b') as f:
+            f.truncate(offset)
+    end_csv_append()
+
+
+def undo_interrupted_csv_append():
+    try:
+        with open(csv_append_marker(), 'r') as f:
+            offset = int(f.read())
+    except FileNotFoundError:
+        return
+    print(f"Removing the rows of an interrupted append from {dataset_file('csv')}")
+    undo_csv_append(offset)
+
+
+def remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def append_dataset(df):
+    """Append rows to the ingested dataset.
+
+    Columnar files cannot be appended in place, so they are rewritten from
+    the existing columnar copy, which is still far cheaper than re-parsing
+    every source csv. The csv export is appended to directly, and cut back
+    if the append fails.
+    """
+    existing = load_dataset()
+    df = typed(df[existing.columns])
+    write_csv = export_csv or dataset_format == 'csv'
+    # Written beside the dataset and swapped in, so a failure leaves the old file whole
+    tmp_file = dataset_file() + '.tmp' + file_extensions[dataset_format]
+    offset = begin_csv_append() if write_csv else None
+    try:
+        if write_csv:
+            df.to_csv(dataset_file('csv'), mode='a', header=offset == 0, index=False)
+        if dataset_format != 'csv':
+            import pandas as pd
+            write_table(pd.concat([existing, df], ignore_index=True), tmp_file)
+            os.replace(tmp_file, dataset_file())
+    except BaseException:
+        if write_csv:
+            undo_csv_append(offset)
+        remove_file(tmp_file)
+        raise
+    if write_csv:
+        end_csv_append()
+
+
+class DatasetWriter:
+    """Write the ingested dataset chunk by chunk with bounded memory.
+
+    Columnar output goes to a temporary file that replaces the dataset on
+    `close()`. With `append=True` the existing columnar rows are streamed
+    into it first, batch by batch, and the csv export is appended in place;
+    if writing fails the csv is cut back to its previous size and the
+    temporary files are removed, so csv and columnar copy stay in step.
+    """
+
+    def __init__(self, append=False, batch_rows=100_000):
+        os.makedirs(output_folder_path, exist_ok=True)
+        self.path = dataset_file()
+        self.csv_path = dataset_file('csv')
+        self.write_csv = export_csv or dataset_format == 'csv'
+        self.csv_offset = None
+        if append and self.write_csv:
+            self.csv_offset = begin_csv_append()
+        self.csv_header = not (append and self.csv_offset)
+        if not append and self.write_csv:
+            open(self.csv_path + '.tmp', 'w').close()
+        self.append = append
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+
+        if append and dataset_format != 'csv':
+            try:
+                for batch in self._existing_batches(batch_rows):
+                    self._write_arrow(batch)
+            except BaseException:
+                self.abort()
+                raise
+
+    def _existing_batches(self, batch_rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if dataset_format == 'parquet':
+            yield from pq.ParquetFile(self.path).iter_batches(batch_size=batch_rows)
+        else:
+            reader = pa.ipc.open_file(self.path)
+            for index in range(reader.num_record_batches):
+                yield reader.get_batch(index)
+
+    def _write_arrow(self, batch):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = batch if isinstance(batch, pa.Table) else pa.Table.from_batches([batch])
+        if self._writer is None:
+            self._schema = table.schema
+            if dataset_format == 'parquet':
+                self._writer = pq.ParquetWriter(self.path + '.tmp', self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path + '.tmp', self._schema)
+        self._writer.write_table(table.cast(self._schema))
+
+    def write(self, df):
+        import pyarrow as pa
+
+        df = typed(df)
+        if dataset_format != 'csv':
+            self._write_arrow(pa.Table.from_pandas(df, preserve_index=False))
+        if self.write_csv:
+            csv_file = self.csv_path if self.append else self.csv_path + '.tmp'
+            df.to_csv(csv_file, mode='a', header=self.csv_header, index=False)
+            self.csv_header = False
+        self.rows += len(df)
+
+    def close(self):
+        try:
+            if self._writer is not None:
+                writer, self._writer = self._writer, None
+                writer.close()
+                os.replace(self.path + '.tmp', self.path)
+            if self.write_csv and not self.append:
+                os.replace(self.csv_path + '.tmp', self.csv_path)
+        except BaseException:
+            self.abort()
+            raise
+        if self.csv_offset is not None:
+            end_csv_append()
+
+    def abort(self):
+        """Drop everything written: remove the temporary files and undo the csv append."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        remove_file(self.path + '.tmp')
+        remove_file(self.csv_path + '.tmp')
+        if self.csv_offset is not None:
+            undo_csv_append(self.csv_offset)
+            self.csv_offset = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -1,50 +1,84 @@
-from flask import Flask, session, jsonify, request
-import pandas as pd
-import numpy as np
 import pickle
 import os
-from sklearn import metrics
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-import json
 import shutil
 
+import datastore
+import sketches
+import versions
+from fastpredict import LinearScorer, check_parity
+from settings import load_config
+
 ##################Load config.json and correct path variable
-with open('config.json','r') as f:
-    config = json.load(f) 
+config = load_config()
 
 dataset_csv_path = os.path.join(config['output_folder_path']) 
 model_path = os.path.join(config['output_model_path'])
-prod_deployment_path = os.path.join(config['prod_deployment_path']) 
+test_data_path = os.path.join(config['test_data_path'])
 
 
 ####################function for deployment
-def store_model_into_pickle():
+def stage_deployment(staging, context=None):
+    """Write every file of a deployment into the staging directory and return the model."""
+    # Copy the trained model, its score and the record of the data it was trained on
+    shutil.copy2(os.path.join(model_path, 'trainedmodel.pkl'), os.path.join(staging, 'trainedmodel.pkl'))
+    shutil.copy2(os.path.join(model_path, 'latestscore.txt'), os.path.join(staging, 'latestscore.txt'))
+    shutil.copy2(os.path.join(dataset_csv_path, 'ingestedfiles.txt'), os.path.join(staging, 'ingestedfiles.txt'))
+    if os.path.exists(os.path.join(dataset_csv_path, 'ingestedmanifest.json')):
+        shutil.copy2(os.path.join(dataset_csv_path, 'ingestedmanifest.json'),
+                     os.path.join(staging, 'ingestedmanifest.json'))
+    
+    # Export the coefficients for the pure-NumPy scorer once they match the pickle
+    if context is not None:
+        model = context.model('trained')
+    else:
+        with open(os.path.join(staging, 'trainedmodel.pkl'), 'rb') as f:
+            model = pickle.load(f)
+    scorer = LinearScorer.from_model(model)
+    check_parity(model, scorer, [os.path.join(test_data_path, 'testdata.csv')],
+                 context.read_table if context is not None else datastore.read_table)
+    scorer.save(os.path.join(staging, 'modelparams.json'))
+    
+    # Write the profile of the training data as the reference for drift checks,
+    # building it from the dataset if it was ingested before profiles existed
+    profile = sketches.load_or_build(sketches.dataset_profile_file, datastore.load_dataset)
+    profile.save(os.path.join(staging, 'referenceprofile.json'))
+    return model
+
+
+def store_model_into_pickle(context=None):
+    """Deploy the trained model as a new immutable version and switch serving to it.
+
+    Every file of the deployment is written to a staging directory that is
+    renamed into versions/ once complete; only then is the current.json
+    pointer replaced, so readers switch from one whole version to the next.
+    """
     # Create deployment directory if it doesn't exist
-    os.makedirs(prod_deployment_path, exist_ok=True)
+    os.makedirs(versions.versions_path, exist_ok=True)
+    version, staging = versions.new_version_dir()
+    try:
+        model = stage_deployment(staging, context)
+        versions.publish(version, staging)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
     
-    # Copy the trained model
-    shutil.copy2(
-        os.path.join(model_path, 'trainedmodel.pkl'),
-        os.path.join(prod_deployment_path, 'trainedmodel.pkl')
-    )
+    # Point serving at the complete version; the API reloads when the pointer changes
+    versions.switch_to(version)
     
-    # Copy the latest score
-    shutil.copy2(
-        os.path.join(model_path, 'latestscore.txt'),
-        os.path.join(prod_deployment_path, 'latestscore.txt')
-    )
+    # The deployed model is now the trained one
+    if context is not None:
+        context.set_model('deployed', model)
     
-    # Copy the ingested files record
-    shutil.copy2(
-        os.path.join(dataset_csv_path, 'ingestedfiles.txt'),
-        os.path.join(prod_deployment_path, 'ingestedfiles.txt')
-    )
+    # Keep only the most recent versions besides the current and previous ones
+    versions.prune()
     
-    print("Model successfully deployed to production")
+    print(f"Model successfully deployed to production as version {version}")
 
 
 if __name__ == '__main__':
-    store_model_into_pickle()
-
-
+    import sys
+    # python deployment.py [rollback [version]]
+    if len(sys.argv) > 1 and sys.argv[1] == 'rollback':
+        versions.rollback(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        store_model_into_pickle()
@@ -1,80 +1,78 @@
-import pandas as pd
-import numpy as np
-import timeit
 import os
 import json
-import pickle
 import subprocess
-from datetime import datetime
-from scipy.stats import ks_2samp
+import time
+
+import datastore
+import sketches
+from model_registry import deployed_model
+from summarystats import summary_cache
+from metricstore import metric_rows, metrics_store
+from versions import deployed_file, deployed_version
+from settings import load_config
 
 ##################Load config.json and get environment variables
-with open('config.json','r') as f:
-    config = json.load(f) 
+config = load_config()
 
 dataset_csv_path = os.path.join(config['output_folder_path']) 
 test_data_path = os.path.join(config['test_data_path']) 
 prod_deployment_path = os.path.join(config['prod_deployment_path'])
+feature_columns = config['numeric_columns']
+data_drift_threshold = config.get('data_drift_threshold', 0.05)
 
 ##################Function to get model predictions
-def model_predictions(dataset_path):
-    # Load the deployed model
-    with open(os.path.join(prod_deployment_path, 'trainedmodel.pkl'), 'rb') as f:
-        model = pickle.load(f)
+def model_predictions(dataset_path, context=None):
+    # Take the deployed model's scorer from the in-process registry, reloaded only after a redeploy
+    scorer = deployed_model.get().scorer
     
-    # Read the dataset
-    data = pd.read_csv(dataset_path)
+    # Read the dataset, through the pipeline context when one is given
+    data = context.read_table(dataset_path) if context is not None else datastore.read_table(dataset_path)
     
     # Prepare features
-    X = data[['lastmonth_activity', 'lastyear_activity', 'number_of_employees']]
+    X = data[feature_columns]
     
     # Make predictions
-    predictions = model.predict(X)
+    predictions = scorer.predict(X)
     
     return predictions.tolist()
 
-##################Function to get summary statistics
-def dataframe_summary():
-    # Read the dataset
-    data = pd.read_csv(os.path.join(dataset_csv_path, 'finaldata.csv'))
-    
-    # Get numeric columns
-    numeric_cols = data.select_dtypes(include=[np.number]).columns
+##################Function to score an in-memory feature array
+def predict_array(X):
+    """Return predictions and positive-class probabilities for an (n, features) float array."""
+    from scipy.special import expit
+    scorer = deployed_model.get().scorer
     
-    # Calculate statistics
-    stats = []
-    for col in numeric_cols:
-        stats.extend([
-            data[col].mean(),
-            data[col].median(),
-            data[col].std()
-        ])
+    # One inference pass gives both the class and its probability
+    scores = scorer.decision_function(X)
+    predictions = scorer.classes[(scores > 0).astype(int)]
     
-    return stats
+    return predictions, expit(scores)
+
+##################Function to get summary statistics
+def dataframe_summary():
+    # Mean, median and std of each numeric column, recomputed only when the dataset changes
+    return summary_cache.get()['summary_statistics']
 
 ##################Function to check for missing data
 def missing_data():
-    # Read the dataset
-    data = pd.read_csv(os.path.join(dataset_csv_path, 'finaldata.csv'))
-    
-    # Calculate percentage of NA values in each column
-    na_percentages = (data.isna().sum() / len(data) * 100).tolist()
-    
-    return na_percentages
+    # Percentage of NA values in each column, recomputed only when the dataset changes
+    return summary_cache.get()['missing_percentages']
+
+def load_dataset_profile():
+    # Build the profile once if the dataset was ingested before profiles existed
+    return sketches.load_or_build(sketches.dataset_profile_file, datastore.load_dataset)
 
 ##################Function to get timings
 def execution_time():
-    # Time ingestion.py
-    start_time = timeit.default_timer()
-    os.system('python ingestion.py')
-    ingestion_time = timeit.default_timer() - start_time
-    
-    # Time training.py
-    start_time = timeit.default_timer()
-    os.system('python training.py')
-    training_time = timeit.default_timer() - start_time
-    
-    return [ingestion_time, training_time]
+    # Time one full ingestion rebuild and one training run, with a fresh hyperparameter search,
+    # on the source data in a scratch workspace, recording the measurement in the timing history.
+    # Repeated runs are left to `python benchmark.py`, so this costs what one retrain does
+    import benchmark
+    record = benchmark.run_timing(repeat=1, warmup=0)
+    
+    # Return the median wall time of each stage
+    return [record['stages']['ingestion']['wall_median'],
+            record['stages']['training']['wall_median']]
 
 ##################Function to check dependencies
 def outdated_packages_list():
@@ -100,48 +98,54 @@ def outdated_packages_list():
     
     return package_info
 
+##################Function to run all API diagnostics
+def collect_diagnostics():
+    """Run the diagnostics served by the /diagnostics endpoint."""
+    return {
+        'execution_times': execution_time(),
+        'missing_data_percentages': missing_data(),
+        'outdated_packages': outdated_packages_list()
+    }
+
 def data_drift_check():
-    """Check for data drift between the last ingested data and the current data."""
+    """Check for data drift between the deployed training data and the current data.
+
+    Both sides are compared through their persisted profiles: the reference
+    profile written at deployment and the profile kept by ingestion. This
+    gives an approximate KS test and the PSI without reading either dataset.
+    """
     # Get the paths
-    current_data_path = os.path.join(dataset_csv_path, 'finaldata.csv')
-    prod_data_path = os.path.join(prod_deployment_path, 'finaldata.csv')
+    reference_profile_file = deployed_file('referenceprofile.json')
+    prod_data_path = deployed_file('finaldata.csv')
     
-    if not os.path.exists(prod_data_path):
-        print("No previous data found for drift comparison")
+    if not os.path.exists(reference_profile_file) and not os.path.exists(prod_data_path):
+        print("No reference profile found for drift comparison")
         return None
     
-    # Read the datasets
-    df_current = pd.read_csv(current_data_path)
-    df_prod = pd.read_csv(prod_data_path)
-    
-    # Get numeric columns
-    numeric_cols = df_current.select_dtypes(include=[np.number]).columns
+    # Load the profiles; deployments made before profiles existed are profiled once from their data
+    reference = sketches.load_or_build(reference_profile_file, lambda: datastore.read_table(prod_data_path))
+    current = load_dataset_profile()
     
     # Initialize drift report
     drift_report = {}
     
-    # Compare distributions for each numeric column
-    for col in numeric_cols:
-        if col in df_prod.columns:
-            stat, p_value = ks_2samp(df_prod[col], df_current[col])
+    # Compare distributions for each sketched column
+    for col, current_sketch in current.columns.items():
+        if col in reference.columns:
+            stat, p_value = sketches.ks_statistic(reference.columns[col], current_sketch)
             drift_report[col] = {
                 'statistic': stat,
                 'p_value': p_value,
-                'drifted': p_value < 0.05
+                'psi': sketches.population_stability_index(reference.columns[col], current_sketch),
+                'drifted': p_value < data_drift_threshold
             }
     
-    # Save drift report to CSV
-    timestamp = datetime.now().isoformat()
-    df_drift = pd.DataFrame({
-        'timestamp': [timestamp],
-        'column': list(drift_report.keys()),
-        'statistic': [drift_report[col]['statistic'] for col in drift_report],
-        'p_value': [drift_report[col]['p_value'] for col in drift_report],
-        'drifted': [drift_report[col]['drifted'] for col in drift_report]
-    })
-    
-    drift_file = os.path.join(dataset_csv_path, 'data_drift.csv')
-    df_drift.to_csv(drift_file, mode='a', header=not os.path.exists(drift_file), index=False)
+    # Append the drift report to the metrics history, every column in one batch
+    timestamp = time.time()
+    metrics_store.write([
+        row for col, report in drift_report.items()
+        for row in metric_rows('drift', report, model_version=deployed_version(), feature=col, ts=timestamp)
+    ])
     
     return drift_report
 
@@ -0,0 +1,97 @@
+import numpy as np
+
+
+
+##################Metrics of a binary classifier from one inference
+def evaluate_model(model, X, y):
+    """Score X once with the model and return every metric against the labels y.
+
+    The decision function gives both the hard labels (positive when above
+    zero, as predict does) and the ranking scores used for ROC AUC, which
+    order rows exactly as predict_proba does.
+    """
+    scores = np.asarray(model.decision_function(X), dtype=np.float64)
+    classes = np.asarray(model.classes_)
+    return compute_metrics(np.asarray(y) == classes[1], scores > 0, scores, classes)
+
+
+def compute_metrics(actual, predicted, scores, classes=(0, 1)):
+    """Return all metrics from boolean actual/predicted positives and the positive-class scores.
+
+    Every count comes from one confusion matrix, so labels are read once;
+    only ROC AUC needs a sort of the scores.
+    """
+    rows = len(actual)
+    tn, fp, fn, tp = (int(count) for count in
+                      np.bincount(actual.astype(np.int64) * 2 + predicted, minlength=4))
+
+    precision = ratio(tp, tp + fp)
+    recall = ratio(tp, tp + fn)
+    # Metrics of the negative class, for the classification report
+    negative_precision = ratio(tn, tn + fn)
+    negative_recall = ratio(tn, tn + fp)
+    accuracy = ratio(tp + tn, rows)
+
+    # Like sklearn, the report covers the classes present in the labels or the predictions
+    per_class = {}
+    if tn + fp + fn:
+        per_class[str(classes[0])] = class_report(negative_precision, negative_recall, tn + fp)
+    if tp + fp + fn:
+        per_class[str(classes[1])] = class_report(precision, recall, tp + fn)
+    macro = {key: float(np.mean([report[key] for report in per_class.values()]))
+             for key in ('precision', 'recall', 'f1-score')}
+    weighted = {key: ratio(sum(report[key] * report['support'] for report in per_class.values()), rows)
+                for key in ('precision', 'recall', 'f1-score')}
+
+    return {
+        'rows': rows,
+        'f1_score': ratio(2 * precision * recall, precision + recall),
+        'accuracy': accuracy,
+        'precision': precision,
+        'recall': recall,
+        'roc_auc': roc_auc(actual, scores),
+        'confusion_matrix': [[tn, fp], [fn, tp]],
+        # Same layout as sklearn's classification_report(output_dict=True)
+        'classification_report': {
+            **per_class,
+            'accuracy': accuracy,
+            'macro avg': dict(macro, support=rows),
+            'weighted avg': dict(weighted, support=rows)
+        }
+    }
+
+
+def ratio(numerator, denominator):
+    """Divide, returning 0.0 for an empty denominator as sklearn does with zero_division."""
+    return float(numerator / denominator) if denominator else 0.0
+
+
+def class_report(precision, recall, support):
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f1-score': ratio(2 * precision * recall, precision + recall),
+        'support': support
+    }
+
+
+def roc_auc(actual, scores):
+    """Return the probability that a positive row scores above a negative one (ties count half).
+
+    This is the Mann-Whitney U statistic over average ranks, equal to the
+    area under the ROC curve; NaN when only one class is present.
+    """
+    positives = int(actual.sum())
+    negatives = len(actual) - positives
+    if positives == 0 or negatives == 0:
+        return float('nan')
+
+    order = np.argsort(scores, kind='mergesort')
+    sorted_scores = scores[order]
+    # Tied scores share the average of the ranks they span
+    starts = np.flatnonzero(np.concatenate([[True], sorted_scores[1:] != sorted_scores[:-1]]))
+    counts = np.diff(np.append(starts, len(scores)))
+    ranks = np.repeat(starts + (counts + 1) / 2, counts)
+
+    rank_sum = ranks[actual[order]].sum()
+    return float((rank_sum - positives * (positives + 1) / 2) / (positives * negatives))
@@ -0,0 +1,113 @@
+import numpy as np
+import os
+import json
+import pickle
+
+import datastore
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+test_data_path = os.path.join(config['test_data_path'])
+feature_columns = config['numeric_columns']
+# Largest absolute difference from the pickled model's probabilities the scorer may show. Its
+# matmul can round differently from sklearn's by a few ULPs (another BLAS, another host),
+# which must not block a deployment; anything larger is a real mismatch
+parity_atol = 1e-12
+
+
+##################Pure-NumPy scorer for the deployed logistic regression
+class LinearScorer:
+    """Score a binary LogisticRegression from its coefficients alone.
+
+    Mirrors the arithmetic of LogisticRegression.decision_function,
+    predict and predict_proba so results match the pickled model, without
+    sklearn's input validation or the pickle itself.
+    """
+
+    def __init__(self, feature_names, coef, intercept, classes):
+        self.feature_names = list(feature_names)
+        self.coef = np.asarray(coef, dtype=np.float64).reshape(1, -1)
+        self.intercept = np.asarray(intercept, dtype=np.float64).reshape(1)
+        self.classes = np.asarray(classes)
+
+    @classmethod
+    def from_model(cls, model, feature_names=feature_columns):
+        return cls(feature_names, model.coef_, model.intercept_, model.classes_)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            params = json.load(f)
+        return cls(params['feature_names'], params['coef'], params['intercept'], params['classes'])
+
+    def save(self, path):
+        params = {
+            'feature_names': self.feature_names,
+            'coef': self.coef.ravel().tolist(),
+            'intercept': self.intercept.tolist(),
+            'classes': self.classes.tolist()
+        }
+        # Write next to the target and rename, so readers never see a partial file
+        with open(path + '.tmp', 'w') as f:
+            json.dump(params, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def features(self, data):
+        """Return an (n, features) numeric array from a DataFrame or array-like.
+
+        Integer and float inputs keep their dtype, as in sklearn's validation,
+        because integer features take a different (non-BLAS) matmul path whose
+        rounding differs from float64 input.
+        """
+        if hasattr(data, 'columns'):
+            data = data[self.feature_names]
+        X = np.asarray(data)
+        if X.dtype.kind not in 'iuf':
+            X = X.astype(np.float64)
+        return X
+
+    def decision_function(self, X):
+        return (self.features(X) @ self.coef.T + self.intercept).ravel()
+
+    def predict_proba(self, X):
+        from scipy.special import expit
+        prob = expit(self.decision_function(X))
+        return np.stack([1 - prob, prob], axis=1)
+
+    def predict(self, X):
+        return self.classes[(self.decision_function(X) > 0).astype(int)]
+
+
+##################Function to check the scorer against the pickled model
+def check_parity(model, scorer, dataset_paths, read_table=datastore.read_table, atol=parity_atol):
+    """Raise if the scorer's predictions or probabilities differ from the model's.
+
+    Probabilities may differ by atol. Predictions must be equal, except for
+    rows whose decision value is within atol of the boundary, where that
+    rounding can flip the class.
+    """
+    for path in dataset_paths:
+        data = read_table(path)
+        X = data[scorer.feature_names]
+        differs = model.predict(X) != scorer.predict(X)
+        if (differs & (np.abs(model.decision_function(X)) > atol)).any():
+            raise ValueError(f"Predictions differ from the pickled model on {path}")
+        if not np.allclose(model.predict_proba(X), scorer.predict_proba(X), rtol=0, atol=atol):
+            raise ValueError(f"Probabilities differ from the pickled model on {path}")
+        print(f"Scorer matches the pickled model on {path} ({len(data)} rows)")
+
+
+if __name__ == '__main__':
+    # Check the exported deployment artifact against the deployed pickle
+    import versions
+    version = versions.current_version()
+    with open(versions.deployed_file('trainedmodel.pkl', version), 'rb') as f:
+        model = pickle.load(f)
+    scorer = LinearScorer.load(versions.deployed_file('modelparams.json', version))
+
+    final_data = datastore.dataset_file() if datastore.dataset_exists() else datastore.dataset_file('csv')
+    check_parity(model, scorer, [os.path.join(test_data_path, 'testdata.csv'), final_data])
@@ -1,22 +1,18 @@
 import os
 import json
-import pandas as pd
-import numpy as np
-import pickle
-import time
-import subprocess
 from datetime import datetime
 
-# Import our custom modules
-import training
-import scoring
-import deployment
-import diagnostics
-import reporting
+# Import our custom modules; the stage modules, and pandas, sklearn and matplotlib
+# with them, are imported only by the stages that run
+import datastore
+import versions
+from artifacts import detect_changes
+from pipeline import PipelineContext
+from scheduler import PipelineScheduler, Stage
+from settings import load_config
 
 # Load configuration
-with open('config.json','r') as f:
-    config = json.load(f) 
+config = load_config()
 
 input_folder_path = config['input_folder_path']
 output_folder_path = config['output_folder_path']
@@ -24,48 +20,52 @@ prod_deployment_path = config['prod_deployment_path']
 output_model_path = config['output_model_path']
 
 def check_for_new_data():
-    """Check if there are new data files that haven't been ingested yet."""
+    """Return the source files added, modified or removed since the deployed data was ingested."""
     print(f"Checking for new data in {input_folder_path}...")
     
-    # Read the list of already ingested files
+    # Read the fingerprints of the deployed data, or just the names of its files
     try:
-        with open(os.path.join(prod_deployment_path, 'ingestedfiles.txt'), 'r') as f:
-            ingested_files = set(f.read().splitlines())
-        print(f"Currently ingested files: {ingested_files}")
+        with open(versions.deployed_file('ingestedmanifest.json'), 'r') as f:
+            ingested_files = json.load(f)['files']
     except FileNotFoundError:
-        print("No ingestedfiles.txt found. Starting fresh.")
-        ingested_files = set()
+        try:
+            with open(versions.deployed_file('ingestedfiles.txt'), 'r') as f:
+                ingested_files = dict.fromkeys(f.read().splitlines())
+        except FileNotFoundError:
+            print("No ingestedfiles.txt found. Starting fresh.")
+            ingested_files = {}
+    print(f"Currently ingested files: {set(ingested_files)}")
     
-    # Get list of all CSV files in the input folder
-    current_files = set(f for f in os.listdir(input_folder_path) if f.endswith('.csv'))
-    print(f"Current files in {input_folder_path}: {current_files}")
+    # Stat every CSV file in the input folder, hashing only those whose size or mtime moved
+    changes = detect_changes(input_folder_path, ingested_files)
+    print(f"Current files in {input_folder_path}: {set(changes.fingerprints)}")
     
-    # Check for new files
-    new_files = current_files - ingested_files
-    print(f"New files found: {new_files}")
-    
-    if new_files:
-        print(f"Found {len(new_files)} new file(s) to ingest: {new_files}")
-        return True
+    if changes:
+        print(f"Added: {changes.added}, modified: {changes.modified}, removed: {changes.removed}")
     else:
-        print("No new files found.")
-        return False
+        print("No new, modified or removed files found.")
+    return changes
 
-def check_for_model_drift():
+def check_for_model_drift(context=None):
     """Check if the model performance has degraded on newly ingested data."""
     # Get the current score from the deployed model
-    with open(os.path.join(prod_deployment_path, 'latestscore.txt'), 'r') as f:
-        current_score = float(f.read())
+    try:
+        with open(versions.deployed_file('latestscore.txt'), 'r') as f:
+            current_score = float(f.read())
+    except FileNotFoundError:
+        print("No deployed model found for drift detection")
+        return False
     print(f"Current model score: {current_score}")
     
     # Load newly ingested data
-    new_data_path = os.path.join(output_folder_path, 'finaldata.csv')
+    new_data_path = datastore.dataset_file()
     if not os.path.exists(new_data_path):
         print("No new data found for drift detection")
         return False
         
     # Score the deployed model on new data
-    new_score = scoring.score_model(use_deployed_model=True, dataset_path=new_data_path)
+    import scoring
+    new_score = scoring.score_model(use_deployed_model=True, dataset_path=new_data_path, context=context)
     print(f"Deployed model score on new data: {new_score}")
     
     # Get drift threshold from config
@@ -82,68 +82,107 @@ def check_for_model_drift():
         print("This indicates the model is still performing well with the new data.")
         return False
 
-def main():
+##################Stages of the pipeline and the artifacts they read and write
+def ingest(context):
+    # Run ingestion in-process on the change set found by the new-data check
+    import ingestion
+    ingestion.merge_multiple_dataframe(changes=context.source_changes or None)
+    context.dataset_changed()
+
+def train(context):
+    import training
+    training.train_model(context=context)
+
+def score(context):
+    import scoring
+    scoring.score_model(context=context)
+
+def deploy(context):
+    import deployment
+    deployment.store_model_into_pickle(context=context)
+
+def report_redeployed(context):
+    import reporting
+    reporting.score_redeployed_model(context=context)
+
+def report(context):
+    import reporting
+    reporting.score_model(context=context)
+
+def run_diagnostics(context):
+    import diagnostics
+    diagnostics.model_predictions(os.path.join('testdata', 'testdata.csv'), context=context)
+    diagnostics.dataframe_summary()
+    diagnostics.missing_data()
+    diagnostics.execution_time()
+    diagnostics.outdated_packages_list()
+    diagnostics.data_drift_check()
+
+dataset_file = datastore.dataset_file()
+ingested_files = os.path.join(output_folder_path, 'ingestedfiles.txt')
+dataset_profile = os.path.join(output_folder_path, 'dataprofile.json')
+test_data = os.path.join(config['test_data_path'], 'testdata.csv')
+trained_model = os.path.join(output_model_path, 'trainedmodel.pkl')
+latest_score = os.path.join(output_model_path, 'latestscore.txt')
+# The pointer names the served version, so its content changes with every deployment and rollback
+deployment_pointer = versions.current_file
+
+pipeline_stages = [
+    Stage('ingestion', ingest,
+          [input_folder_path], [dataset_file, ingested_files, dataset_profile]),
+    Stage('training', train,
+          [dataset_file], [trained_model]),
+    Stage('scoring', score,
+          [trained_model, test_data], [latest_score]),
+    Stage('deployment', deploy,
+          [trained_model, latest_score, ingested_files, dataset_profile],
+          [deployment_pointer]),
+    Stage('redeployed_reporting', report_redeployed,
+          [deployment_pointer, test_data], [os.path.join(output_model_path, 'confusionmatrix2.json')]),
+    Stage('reporting', report,
+          [deployment_pointer, test_data], [os.path.join(output_model_path, 'confusionmatrix.json')]),
+    Stage('diagnostics', run_diagnostics,
+          [deployment_pointer, test_data, dataset_file], [os.path.join(output_model_path, 'metrics.db')])
+]
+
+# Inputs of the drift check; it is repeated only once they change or while drift persists
+drift_check = Stage('drift_check', check_for_model_drift,
+                    [deployment_pointer, test_data, dataset_file], [])
+
+def main(context=None):
     print(f"\nRunning full process at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
+    # Datasets and models are loaded at most once and shared by every stage of the run;
+    # a long-running caller can pass the same context to every run
+    if context is None:
+        context = PipelineContext()
+    force = set()
+    
+    # Deployments made before versioning become the first version
+    versions.migrate_legacy()
+    
     # Step 1: Check for new data
     print("\nChecking for new data...")
-    has_new_data = check_for_new_data()
-    
-    if has_new_data:
+    context.source_changes = check_for_new_data()
+    if context.source_changes:
         print("New data found. Proceeding with ingestion and retraining...")
-        # Run ingestion
-        subprocess.run(['python', 'ingestion.py'], check=True)
-        
-        # Retrain the model with new data
-        print("\nRetraining model with new data...")
-        training.train_model()
-        
-        # Score the new model
-        print("\nScoring new model...")
-        scoring.score_model()
-        
-        # Deploy the new model
-        print("\nDeploying new model...")
-        deployment.store_model_into_pickle()
-        
-        # Score the redeployed model
-        print("\nScoring redeployed model...")
-        reporting.score_redeployed_model()
-    else:
-        print("No new data found. Checking for model drift...")
+        force.add('ingestion')
     
-    # Step 2: Check for model drift
+    # Step 2: Check the deployed model for drift; retraining reruns every stage that depends on it
     print("\nChecking for model drift...")
-    has_drift = check_for_model_drift()
-    
-    if has_drift:
+    scheduler = PipelineScheduler(pipeline_stages)
+    up_to_date, fingerprints = scheduler.check(drift_check)
+    if up_to_date:
+        print("Deployed model and test data unchanged since the last check found no drift.")
+    elif check_for_model_drift(context=context):
         print("Model drift detected. Retraining model...")
-        # Retrain the model
-        training.train_model()
-        
-        # Score the new model
-        scoring.score_model()
-        
-        # Deploy the new model
-        deployment.store_model_into_pickle()
-        
-        # Score the redeployed model
-        print("\nScoring redeployed model...")
-        reporting.score_redeployed_model()
+        force.add('training')
     else:
-        print("No model drift detected.")
-    
-    # Step 3: Run diagnostics and reporting
-    print("\nRunning diagnostics...")
-    diagnostics.model_predictions(os.path.join('testdata', 'testdata.csv'))
-    diagnostics.dataframe_summary()
-    diagnostics.missing_data()
-    diagnostics.execution_time()
-    diagnostics.outdated_packages_list()
-    diagnostics.data_drift_check()
+        scheduler.record(drift_check, fingerprints)
     
-    print("\nGenerating reports...")
-    reporting.score_model()
+    # Step 3: Run the stages whose inputs changed, independent ones concurrently
+    outcomes = scheduler.run(context, force=force)
+    print(f"\nStage outcomes: {outcomes}")
     
     print("\nProcess completed successfully!")
 
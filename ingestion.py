@@ -1,57 +1,435 @@
-import pandas as pd
-import numpy as np
-import os
-import json
-from datetime import datetime
-
-
-
-
-#############Load config.json and get input and output paths
-with open('config.json','r') as f:
-    config = json.load(f) 
-
-input_folder_path = config['input_folder_path']
-output_folder_path = config['output_folder_path']
-
-
-
-#############Function for data ingestion
-def merge_multiple_dataframe():
-    # Initialize an empty list to store DataFrames
-    dfs = []
-    ingested_files = []
-    
-    # Get all CSV files in the input folder
-    for file in os.listdir(input_folder_path):
-        if file.endswith('.csv'):
-            file_path = os.path.join(input_folder_path, file)
-            df = pd.read_csv(file_path)
-            dfs.append(df)
-            ingested_files.append(file)
-    
-    # Combine all DataFrames
-    if dfs:
-        final_df = pd.concat(dfs, ignore_index=True)
-        
-        # Remove duplicates
-        final_df = final_df.drop_duplicates()
-        
-        # Create output directory if it doesn't exist
-        os.makedirs(output_folder_path, exist_ok=True)
-        
-        # Save the final dataset
-        final_df.to_csv(os.path.join(output_folder_path, 'finaldata.csv'), index=False)
-        
-        # Save the list of ingested files
-        with open(os.path.join(output_folder_path, 'ingestedfiles.txt'), 'w') as f:
-            f.write('\n'.join(ingested_files))
-        
-        print(f"Successfully ingested {len(ingested_files)} files")
-        print(f"Final dataset shape: {final_df.shape}")
-    else:
-        print("No CSV files found in the input directory")
-
-
-if __name__ == '__main__':
-    merge_multiple_dataframe()
+import pandas as pd
+import numpy as np
+import os
+import json
+import shutil
+import tempfile
+import uuid
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import datastore
+import sketches
+from artifacts import compare_fingerprints, detect_changes
+from settings import load_config
+
+
+
+
+#############Load config.json and get input and output paths
+config = load_config()
+
+input_folder_path = config['input_folder_path']
+output_folder_path = config['output_folder_path']
+numeric_columns = config['numeric_columns']
+target_column = config['target_column']
+incremental_ingestion = config.get('incremental_ingestion', True)
+# 'in_memory' reads whole files one after another, 'parallel' reads them across a
+# process pool and 'streaming' reads them in chunks within the memory budget
+ingestion_mode = config.get('ingestion_mode', 'in_memory')
+memory_budget_mb = config.get('ingestion_memory_budget_mb', 256)
+# Share of the streaming budget for the row hashes collected during a run; the CSV chunks get the rest
+hash_budget_fraction = 0.25
+ingestion_workers = config.get('ingestion_workers') or os.cpu_count()
+
+manifest_file = os.path.join(output_folder_path, 'ingestedmanifest.json')
+row_index_file = os.path.join(output_folder_path, 'rowhashes.npy')
+# Sorted row hashes of each ingested source file, to remove its rows when it changes
+file_hashes_folder = os.path.join(output_folder_path, 'filehashes')
+
+
+
+#############Helpers for incremental ingestion
+def hash_rows(df):
+    """Hash every row of a DataFrame so duplicates can be found without the data."""
+    # Numbers are hashed as floats so that 1 and 1.0 collide like in drop_duplicates
+    value_columns = [col for col in numeric_columns + [target_column] if col in df.columns]
+    normalised = df.astype({col: 'float64' for col in value_columns})
+    return pd.util.hash_pandas_object(normalised, index=False).to_numpy()
+
+
+def sorted_contains(sorted_hashes, row_hashes):
+    """Return which row_hashes are in sorted_hashes, touching only the entries searched."""
+    positions = np.searchsorted(sorted_hashes, row_hashes)
+    found = positions < len(sorted_hashes)
+    found[found] = sorted_hashes[positions[found]] == row_hashes[found]
+    return found
+
+
+def merge_sorted(sorted_hashes, new_hashes):
+    """Merge hashes not yet in the sorted index into it, keeping it sorted."""
+    # A stable sort of two sorted runs is a linear merge
+    return np.sort(np.concatenate([sorted_hashes, np.sort(new_hashes)]), kind='stable')
+
+
+def load_row_index(mmap=False):
+    """Load the sorted row-hash index, memory-mapped from disk when mmap is set."""
+    row_hashes = np.load(row_index_file, mmap_mode='r' if mmap else None)
+    return row_hashes if len(row_hashes) else np.empty(0, dtype=np.uint64)
+
+
+def save_row_index(row_hashes):
+    # Write beside the index and swap, since the old index may still be memory-mapped
+    with open(row_index_file + '.tmp', 'wb') as f:
+        np.save(f, row_hashes)
+    os.replace(row_index_file + '.tmp', row_index_file)
+
+
+def load_dataset_profile():
+    """Load the profile of the dataset, building it if the dataset predates profiling."""
+    return sketches.load_or_build(sketches.dataset_profile_file, datastore.load_dataset)
+
+
+def load_manifest():
+    """Load the manifest of previously ingested files, or an empty one."""
+    try:
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(manifest):
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def file_hashes_path(file):
+    return os.path.join(file_hashes_folder, file + '.npy')
+
+
+def save_file_hashes(file, row_hashes):
+    os.makedirs(file_hashes_folder, exist_ok=True)
+    np.save(file_hashes_path(file), np.sort(row_hashes))
+
+
+def load_file_hashes(file):
+    """Load the sorted row hashes of a source file, or None if they were never saved."""
+    try:
+        return np.load(file_hashes_path(file))
+    except FileNotFoundError:
+        return None
+
+
+def chunk_rows_for_budget(file_path):
+    """Pick how many rows of a file to parse at a time so a chunk fits the memory budget."""
+    sample = pd.read_csv(file_path, nrows=1000, dtype=datastore.column_dtypes)
+    bytes_per_row = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    
+    # A chunk is held several times over: parsed, deduplicated, typed and encoded for output
+    chunk_budget = memory_budget_mb * 2**20 * (1 - hash_budget_fraction)
+    return max(1000, int(chunk_budget / (bytes_per_row * 8)))
+
+
+def hash_buffer_rows():
+    """Return how many hashes each of the two HashRuns of a streaming run may hold in memory."""
+    # A buffer is briefly held three times over while new hashes are merged into it
+    return max(1000, int(memory_budget_mb * 2**20 * hash_budget_fraction / (2 * 3 * 8)))
+
+
+def read_block(run, start, rows):
+    """Read rows hashes of a run from start; memory-mapped runs are read without mapping the pages."""
+    if isinstance(run, np.memmap):
+        count = max(min(rows, len(run) - start), 0)
+        return np.fromfile(run.filename, dtype=run.dtype, count=count, offset=run.offset + start * run.itemsize)
+    return run[start:start + rows]
+
+
+def write_merged(path, runs, block_rows):
+    """Merge sorted hash arrays into one sorted .npy file, reading block_rows of each at a time.
+
+    The runs may be memory-mapped and larger than memory: each step writes
+    every hash up to the smallest last hash of the current blocks, which
+    no later block can undercut, so neither the runs nor the output are
+    ever held in full.
+    """
+    runs = [run for run in runs if len(run)]
+    positions = [0] * len(runs)
+    header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.uint64)), 'fortran_order': False,
+              'shape': (sum(len(run) for run in runs),)}
+    # Write beside the target and swap, since one of the runs may be the old file
+    with open(path + '.tmp', 'wb') as f:
+        np.lib.format.write_array_header_1_0(f, header)
+        while True:
+            active = [i for i, run in enumerate(runs) if positions[i] < len(run)]
+            if not active:
+                break
+            blocks = {i: read_block(runs[i], positions[i], block_rows) for i in active}
+            cutoff = min(block[-1] for block in blocks.values())
+            parts = []
+            for i, block in blocks.items():
+                end = int(np.searchsorted(block, cutoff, side='right'))
+                parts.append(block[:end])
+                positions[i] += end
+            f.write(np.sort(np.concatenate(parts)).tobytes())
+    os.replace(path + '.tmp', path)
+
+
+class HashRuns:
+    """Sorted row hashes collected during a streaming run, within a fixed memory allowance.
+
+    New hashes go to a sorted buffer of at most max_rows; a full buffer is
+    written to disk as a sorted run and memory-mapped. Runs of similar size
+    are merged on disk, so only a few, of geometrically growing size, are
+    searched per chunk, and the runs are merged once more by save().
+    """
+
+    def __init__(self, spill_folder, max_rows):
+        self.spill_folder = spill_folder
+        self.max_rows = max_rows
+        self.buffer = np.empty(0, dtype=np.uint64)
+        self.runs = []
+        self.rows = 0
+
+    def contains(self, row_hashes):
+        found = sorted_contains(self.buffer, row_hashes)
+        for run in self.runs:
+            found |= sorted_contains(run, row_hashes)
+        return found
+
+    def add(self, row_hashes):
+        self.buffer = merge_sorted(self.buffer, row_hashes)
+        self.rows += len(row_hashes)
+        if len(self.buffer) >= self.max_rows:
+            self.spill()
+
+    def spill(self):
+        path = os.path.join(self.spill_folder, uuid.uuid4().hex + '.npy')
+        np.save(path, self.buffer)
+        self.runs.append(np.load(path, mmap_mode='r'))
+        self.buffer = np.empty(0, dtype=np.uint64)
+        # Merge the newest run into the one before while it is as large
+        while len(self.runs) > 1 and len(self.runs[-1]) >= len(self.runs[-2]):
+            newer, older = self.runs.pop(), self.runs.pop()
+            write_merged(older.filename, [older, newer], self.max_rows // 2)
+            os.remove(newer.filename)
+            self.runs.append(np.load(older.filename, mmap_mode='r'))
+
+    def save(self, path, *others):
+        """Write these hashes and the sorted arrays in others to path as one sorted array."""
+        runs = self.runs + [self.buffer] + list(others)
+        write_merged(path, runs, max(1, self.max_rows // len(runs)))
+
+
+def stream_files(files, append=False):
+    """Ingest files chunk by chunk, writing each deduplicated chunk straight to the dataset.
+
+    Rows already in the dataset are found with a binary search of the
+    memory-mapped row-hash index. The hashes of rows added in this run and
+    of each file's rows are kept as HashRuns, which spill to disk beyond
+    their share of the memory budget, so memory does not grow with the
+    size of the input.
+    """
+    existing_hashes = load_row_index(mmap=True) if append else np.empty(0, dtype=np.uint64)
+    dataset_profile = load_dataset_profile() if append else sketches.DatasetProfile()
+    os.makedirs(file_hashes_folder, exist_ok=True)
+    spill_folder = tempfile.mkdtemp(prefix='.hashruns-', dir=output_folder_path)
+    added_hashes = HashRuns(spill_folder, hash_buffer_rows())
+    
+    try:
+        with datastore.DatasetWriter(append=append) as writer:
+            for file in files:
+                stream_file(file, writer, existing_hashes, added_hashes, dataset_profile, spill_folder)
+        
+        added_hashes.save(row_index_file, existing_hashes)
+    finally:
+        shutil.rmtree(spill_folder, ignore_errors=True)
+    dataset_profile.save(sketches.dataset_profile_file)
+    return added_hashes.rows
+
+
+def stream_file(file, writer, existing_hashes, added_hashes, dataset_profile, spill_folder):
+    """Stream one source file into writer and save the sorted hashes of its rows."""
+    file_hashes = HashRuns(spill_folder, hash_buffer_rows())
+    file_path = os.path.join(input_folder_path, file)
+    chunks = pd.read_csv(file_path, dtype=datastore.column_dtypes,
+                         chunksize=chunk_rows_for_budget(file_path))
+    for chunk in chunks:
+        row_hashes = hash_rows(chunk)
+        
+        # Keep the first copy of rows repeated within the chunk
+        _, first = np.unique(row_hashes, return_index=True)
+        first.sort()
+        chunk, row_hashes = chunk.iloc[first], row_hashes[first]
+        
+        # Drop rows seen in the dataset or earlier in this run
+        is_new = ~(sorted_contains(existing_hashes, row_hashes) | added_hashes.contains(row_hashes))
+        writer.write(chunk[is_new])
+        dataset_profile.update(chunk[is_new])
+        added_hashes.add(row_hashes[is_new])
+        file_hashes.add(row_hashes)
+    file_hashes.save(file_hashes_path(file))
+
+
+def read_source_file(file):
+    """Parse one source file and drop its duplicate rows, returning the rows and their hashes."""
+    df = pd.read_csv(os.path.join(input_folder_path, file)).drop_duplicates()
+    return df, hash_rows(df)
+
+
+def read_files(files):
+    """Read files into one deduplicated DataFrame along with its row hashes and each file's.
+
+    In parallel mode the files are parsed across a process pool. Results
+    are combined in file order, so the output does not depend on which
+    worker finishes first.
+    """
+    if ingestion_mode == 'parallel' and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(ingestion_workers, len(files))) as executor:
+            parsed = list(executor.map(read_source_file, files))
+    else:
+        parsed = [read_source_file(file) for file in files]
+
+    df = pd.concat([df for df, _ in parsed], ignore_index=True)
+    row_hashes = np.concatenate([hashes for _, hashes in parsed])
+    file_hashes = {file: hashes for file, (_, hashes) in zip(files, parsed)}
+
+    # Remove duplicates across files, keeping the first copy like drop_duplicates
+    _, first = np.unique(row_hashes, return_index=True)
+    first.sort()
+    return df.iloc[first], row_hashes[first], file_hashes
+
+
+def rebuild_dataset(source_files):
+    """Read every source file and rewrite the dataset and row-hash index."""
+    shutil.rmtree(file_hashes_folder, ignore_errors=True)
+    if ingestion_mode == 'streaming':
+        rows = stream_files(source_files)
+        print(f"Rebuilt dataset from {len(source_files)} files in streaming mode ({rows} rows)")
+        return
+    
+    final_df, row_hashes, file_hashes = read_files(source_files)
+
+    # Save the final dataset, its row-hash index, its profile and the hashes of each file
+    datastore.write_dataset(final_df)
+    save_row_index(np.sort(row_hashes))
+    sketches.DatasetProfile().update(final_df).save(sketches.dataset_profile_file)
+    for file, hashes in file_hashes.items():
+        save_file_hashes(file, hashes)
+
+    print(f"Rebuilt dataset from {len(source_files)} files")
+    print(f"Final dataset shape: {final_df.shape}")
+
+
+def append_to_dataset(new_files):
+    """Read only the new source files and append rows not already in the dataset."""
+    if ingestion_mode == 'streaming':
+        rows = stream_files(new_files, append=True)
+        print(f"Appended {rows} new rows from {len(new_files)} files in streaming mode")
+        return
+    
+    new_df, row_hashes, file_hashes = read_files(new_files)
+
+    # Drop rows already present in the dataset using the persisted row-hash index
+    existing_hashes = load_row_index()
+    is_new = ~sorted_contains(existing_hashes, row_hashes)
+    new_df = new_df[is_new]
+
+    datastore.append_dataset(new_df)
+    save_row_index(merge_sorted(existing_hashes, row_hashes[is_new]))
+    load_dataset_profile().update(new_df).save(sketches.dataset_profile_file)
+    for file, hashes in file_hashes.items():
+        save_file_hashes(file, hashes)
+
+    print(f"Appended {len(new_df)} new rows from {len(new_files)} files")
+
+
+def remove_stale_rows(stale_files, unchanged_files):
+    """Remove the rows that only stale_files contributed to the dataset.
+
+    Rows are matched through the saved row hashes of each file, so no source
+    file is parsed. A row that an unchanged file also contains is kept.
+    Returns False when the dataset has to be rebuilt instead: in streaming
+    mode, which must not load the whole dataset, or when a file's hashes
+    were never saved.
+    """
+    if ingestion_mode == 'streaming':
+        return False
+    stale = [load_file_hashes(file) for file in stale_files]
+    unchanged = [load_file_hashes(file) for file in unchanged_files]
+    if any(hashes is None for hashes in stale + unchanged):
+        return False
+
+    stale = np.sort(np.concatenate(stale))
+    unchanged = np.sort(np.concatenate(unchanged)) if unchanged else np.empty(0, dtype=np.uint64)
+    dropped = stale[~sorted_contains(unchanged, stale)]
+
+    # Rewrite the dataset, its index and its profile without the dropped rows
+    df = datastore.load_dataset()
+    row_hashes = hash_rows(df)
+    keep = ~sorted_contains(dropped, row_hashes)
+    if not keep.all():
+        df = df[keep]
+        datastore.write_dataset(df)
+        save_row_index(np.sort(row_hashes[keep]))
+        sketches.DatasetProfile().update(df).save(sketches.dataset_profile_file)
+
+    for file in stale_files:
+        os.remove(file_hashes_path(file))
+
+    print(f"Removed {int((~keep).sum())} rows contributed only by {stale_files}")
+    return True
+
+
+
+#############Function for data ingestion
+def merge_multiple_dataframe(incremental=None, changes=None):
+    """Bring the dataset up to date with the source folder.
+
+    `changes` is a ChangeSet of the source files already found by the
+    caller, whose fingerprints are reused instead of touching the files
+    again; without one the folder is stat'ed and hashed here. Either way
+    the files are compared with the manifest of the last ingestion. Added
+    files are appended, and the rows of modified and removed files are
+    taken out before modified files are read again, so unchanged files are
+    never re-parsed.
+    """
+    if incremental is None:
+        incremental = incremental_ingestion
+
+    # Fingerprint the source files, hashing only those whose size or mtime moved
+    previous = load_manifest().get('files', {}) if incremental else {}
+    if changes is None:
+        changes = detect_changes(input_folder_path, previous)
+    else:
+        changes = compare_fingerprints(changes.fingerprints, previous)
+    source_files = sorted(changes.fingerprints)
+    if not source_files:
+        print("No CSV files found in the input directory")
+        return
+
+    # Create output directory if it doesn't exist
+    os.makedirs(output_folder_path, exist_ok=True)
+
+    can_update = (incremental and os.path.exists(manifest_file)
+                  and datastore.dataset_exists() and os.path.exists(row_index_file))
+    stale_files = changes.modified + changes.removed
+    changed_files = sorted(changes.added + changes.modified)
+
+    # Rows only ever appended keep the dataset's id, so training can tell what it already saw
+    dataset_id = load_manifest().get('dataset_id') if can_update else None
+    if not can_update:
+        rebuild_dataset(source_files)
+    else:
+        if stale_files:
+            print(f"Modified or removed files detected: {stale_files}")
+            dataset_id = None
+        if stale_files and not remove_stale_rows(stale_files,
+                                                 [file for file in source_files if file not in changed_files]):
+            rebuild_dataset(source_files)
+        elif changed_files:
+            append_to_dataset(changed_files)
+        elif not stale_files:
+            print("No new or changed files, dataset is up to date")
+
+    # Save the manifest and the list of ingested files
+    save_manifest({'updated': datetime.now().isoformat(), 'dataset_id': dataset_id or uuid.uuid4().hex,
+                   'files': changes.fingerprints})
+    with open(os.path.join(output_folder_path, 'ingestedfiles.txt'), 'w') as f:
+        f.write('\n'.join(source_files))
+
+    print(f"Successfully ingested {len(source_files)} files")
+
+
+if __name__ == '__main__':
+    merge_multiple_dataframe()
@@ -0,0 +1,72 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+
+##################Background job runner
+class JobRunner:
+    """Run a function on a background thread, one run at a time.
+
+    `submit()` starts a run, or returns the run already in progress so
+    concurrent callers attach to it instead of starting a duplicate. The
+    most recent finished run is kept so its result can be served while the
+    next one is running.
+    """
+
+    def __init__(self, fn, history=20):
+        self.fn = fn
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._running = None
+        self._latest = None
+
+    def submit(self):
+        with self._lock:
+            if self._running is not None:
+                return dict(self._running)
+
+            job = {
+                'job_id': uuid.uuid4().hex,
+                'status': 'running',
+                'started': datetime.now().isoformat(),
+                'finished': None,
+                'result': None,
+                'error': None
+            }
+            self._jobs[job['job_id']] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+            self._running = job
+
+        self._executor.submit(self._run, job)
+        return dict(job)
+
+    def _run(self, job):
+        try:
+            result, status, error = self.fn(), 'succeeded', None
+        except Exception as e:
+            result, status, error = None, 'failed', str(e)
+
+        with self._lock:
+            job.update(status=status, result=result, error=error,
+                       finished=datetime.now().isoformat())
+            self._running = None
+            self._latest = job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def running(self):
+        with self._lock:
+            return dict(self._running) if self._running else None
+
+    def latest(self):
+        with self._lock:
+            return dict(self._latest) if self._latest else None
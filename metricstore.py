@@ -0,0 +1,294 @@
+import os
+import csv
+import math
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+dataset_csv_path = os.path.join(config['output_folder_path'])
+model_path = os.path.join(config['output_model_path'])
+prod_deployment_path = os.path.join(config['prod_deployment_path'])
+metrics_db_file = os.path.join(model_path, 'metrics.db')
+
+# The CSV files metrics were appended to before the store existed, imported once when it is created
+legacy_csv_files = [
+    os.path.join(model_path, 'model_scores.csv'),
+    os.path.join(prod_deployment_path, 'model_scores.csv'),
+    os.path.join(model_path, 'detailed_metrics.csv'),
+    os.path.join(dataset_csv_path, 'data_drift.csv')
+]
+
+# One row per metric value. source is the writer ('scoring', 'reporting' or 'drift'),
+# dataset what was scored and feature the column a drift metric belongs to
+schema = """
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    model_type TEXT,
+    model_version TEXT,
+    dataset TEXT,
+    feature TEXT,
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS metrics_ts ON metrics (ts);
+CREATE INDEX IF NOT EXISTS metrics_version_ts ON metrics (model_version, ts);
+CREATE INDEX IF NOT EXISTS metrics_name_ts ON metrics (name, ts);
+"""
+row_fields = ['ts', 'source', 'model_type', 'model_version', 'dataset', 'feature', 'name', 'value']
+
+# Per-bucket aggregates of every series (metric name, model type and feature), kept up to date
+# by each write so history is read from a few rows per bucket instead of every metric value.
+# Missing model types and features are stored as '' so they can be part of the key
+rollup_schema = """
+CREATE TABLE metric_rollups (
+    resolution INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    model_type TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (resolution, name, model_type, feature, bucket)
+) WITHOUT ROWID;
+CREATE INDEX metric_rollups_bucket ON metric_rollups (resolution, name, bucket);
+"""
+# Bucket widths of the rollups, in seconds
+rollup_resolutions = {'hour': 3600, 'day': 86400}
+rollup_upsert = """
+INSERT INTO metric_rollups (resolution, name, model_type, feature, bucket, count, sum, min, max)
+VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)
+ON CONFLICT (resolution, name, model_type, feature, bucket) DO UPDATE SET
+    count = count + 1, sum = sum + excluded.sum,
+    min = MIN(min, excluded.min), max = MAX(max, excluded.max)
+"""
+
+
+def metric_value(value):
+    """Return value as a float, or None when it is missing or not finite (NaN, inf)."""
+    if value in (None, ''):
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def metric_rows(source, values, model_type=None, model_version=None, dataset=None, feature=None, ts=None):
+    """Return one store row per entry of values ({name: value}), all with the same labels.
+
+    Values without a finite number, such as ROC AUC on single-class labels,
+    are stored as NULL and left out of the rollups.
+    """
+    ts = time.time() if ts is None else ts
+    return [{'ts': ts, 'source': source, 'model_type': model_type, 'model_version': model_version,
+             'dataset': dataset, 'feature': feature, 'name': name, 'value': metric_value(value)}
+            for name, value in values.items()]
+
+
+##################Embedded metrics store
+class MetricsStore:
+    """Append-only metric history in SQLite.
+
+    The database runs in WAL mode, so readers never block the writer and
+    the pipeline, the daemon and the API can share it. Every thread gets
+    its own connection; each batch of rows is one transaction, and a busy
+    timeout makes concurrent writers queue instead of failing.
+    """
+
+    def __init__(self, path=metrics_db_file):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        with self._lock:
+            if not self._ready:
+                self.create(conn)
+                self._ready = True
+        return conn
+
+    def create(self, conn):
+        """Create the schema, importing the legacy CSV history if the store is new.
+
+        A store created before rollups existed gets them built from its rows.
+        """
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            is_new = not table_exists(conn, 'metrics')
+            for statement in schema.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+            if not table_exists(conn, 'metric_rollups'):
+                for statement in rollup_schema.split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+                for seconds in rollup_resolutions.values():
+                    conn.execute(
+                        "INSERT INTO metric_rollups "
+                        "SELECT ?, name, COALESCE(model_type, ''), COALESCE(feature, ''), "
+                        "CAST(ts / ? AS INTEGER) * ? AS bucket, COUNT(*), SUM(value), MIN(value), MAX(value) "
+                        "FROM metrics WHERE value IS NOT NULL GROUP BY 2, 3, 4, 5",
+                        [seconds, seconds, seconds])
+            if is_new:
+                self.insert(conn, import_legacy_csv())
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def insert(self, conn, rows):
+        conn.executemany(
+            f"INSERT INTO metrics ({', '.join(row_fields)}) VALUES ({', '.join('?' * len(row_fields))})",
+            [tuple(row[field] for field in row_fields) for row in rows])
+        # Fold the values into the rollups in the same transaction, so both always agree
+        conn.executemany(rollup_upsert, [
+            (seconds, row['name'], row['model_type'] or '', row['feature'] or '',
+             int(row['ts'] // seconds) * seconds, row['value'], row['value'], row['value'])
+            for row in rows if row['value'] is not None
+            for seconds in rollup_resolutions.values()
+        ])
+
+    def write(self, rows):
+        """Append a batch of rows in one transaction."""
+        if not rows:
+            return
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.insert(conn, rows)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def record(self, source, values, **labels):
+        """Append every metric in values ({name: value}) with the same timestamp and labels."""
+        self.write(metric_rows(source, values, **labels))
+
+    def query(self, name=None, start=None, end=None, limit=None, **labels):
+        """Return the rows with ts in [start, end), oldest first, filtered by name and labels."""
+        where, params = filters(name, start, end, labels)
+        sql = f"SELECT {', '.join(row_fields)} FROM metrics{where} ORDER BY ts, id"
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def history(self, name, resolution='hour', model_type=None, feature=None, start=None, end=None,
+                after=None, limit=None):
+        """Return count, mean, min and max of a metric per hour or day bucket, oldest first.
+
+        Read from the rollups through their primary key, so the cost depends
+        on the buckets returned, not on the number of metric values. Without
+        model_type or feature the matching series are combined. Buckets
+        overlapping [start, end) are returned; pass the last bucket of a page
+        as `after` to get the next one.
+        """
+        seconds = rollup_resolutions[resolution]
+        clauses, params = ['resolution = ?', 'name = ?'], [seconds, name]
+        for field, value in (('model_type', model_type), ('feature', feature)):
+            if value is not None:
+                clauses.append(f'{field} = ?')
+                params.append(value)
+        if start is not None:
+            clauses.append('bucket > ?')
+            params.append(start - seconds)
+        if end is not None:
+            clauses.append('bucket < ?')
+            params.append(end)
+        if after is not None:
+            clauses.append('bucket > ?')
+            params.append(after)
+        sql = (f"SELECT bucket, SUM(count) AS count, SUM(sum) / SUM(count) AS mean, MIN(min) AS min, "
+               f"MAX(max) AS max FROM metric_rollups WHERE {' AND '.join(clauses)} "
+               f"GROUP BY bucket ORDER BY bucket")
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def series(self):
+        """Return every metric name, model type and feature with history, with its first and last day."""
+        sql = ("SELECT name, model_type, feature, MIN(bucket) AS first, MAX(bucket) AS last "
+               "FROM metric_rollups WHERE resolution = ? GROUP BY name, model_type, feature")
+        return [dict(row) for row in self.connection().execute(sql, [rollup_resolutions['day']])]
+
+
+def table_exists(conn, table):
+    return conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        [table]).fetchone() is not None
+
+
+def filters(name, start, end, labels):
+    """Build the WHERE clause of a query; only known label columns are accepted."""
+    clauses, params = [], []
+    if name is not None:
+        clauses.append('name = ?')
+        params.append(name)
+    if start is not None:
+        clauses.append('ts >= ?')
+        params.append(start)
+    if end is not None:
+        clauses.append('ts < ?')
+        params.append(end)
+    for field, value in labels.items():
+        if field not in row_fields:
+            raise ValueError(f"Unknown metric label: {field}")
+        clauses.append(f'{field} = ?')
+        params.append(value)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+##################Import of the CSV history
+def import_legacy_csv(files=legacy_csv_files):
+    """Convert the rows of the old append-only CSV files to store rows.
+
+    The files are read with the csv module because detailed_metrics.csv
+    mixes rows with and without a trailing model_type column.
+    """
+    rows = []
+    for path in files:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            for record in reader:
+                values = dict(zip(header + ['model_type'], record))
+                ts = datetime.fromisoformat(values.pop('timestamp')).timestamp()
+                if 'column' in values:
+                    rows += metric_rows('drift', {name: float(values[name] == 'True') if name == 'drifted'
+                                                  else values[name]
+                                                  for name in ('statistic', 'p_value', 'psi', 'drifted')},
+                                        feature=values['column'], ts=ts)
+                elif 'dataset' in values:
+                    rows += metric_rows('scoring', {'f1_score': values['f1_score']},
+                                        model_type=values['model_type'], dataset=values['dataset'], ts=ts)
+                else:
+                    model_type = values.pop('model_type', None) or 'deployed'
+                    rows += metric_rows('reporting', values, model_type=model_type,
+                                        dataset='testdata.csv', ts=ts)
+        print(f"Imported metric history from {path}")
+    return rows
+
+
+metrics_store = MetricsStore()
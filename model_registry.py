@@ -0,0 +1,88 @@
+import os
+import pickle
+import threading
+from collections import namedtuple
+
+import versions
+from fastpredict import LinearScorer
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+prod_deployment_path = os.path.join(config['prod_deployment_path'])
+
+
+# A scorer for the deployed model together with the deployment version it came from
+DeployedModel = namedtuple('DeployedModel', ['version', 'scorer'])
+
+
+##################Process-wide holder for the deployed model
+class ModelRegistry:
+    """Keep the deployed model in memory and reload it when a redeploy happens.
+
+    The model is served by a LinearScorer built from the exported
+    modelparams.json, or from the pickle for deployments made before the
+    export existed.
+
+    `get()` checks the deployment pointer, so a redeploy or a rollback is
+    served without a restart. It returns an immutable snapshot. A switch
+    swaps the snapshot held by the registry, so callers that already hold
+    the previous one keep using the model they started with.
+    """
+
+    def __init__(self, deployment_path=prod_deployment_path):
+        self.deployment_path = deployment_path
+        self._lock = threading.Lock()
+        self._current = None
+
+    def deployed_version(self):
+        """Return the served version from the deployment pointer.
+
+        Deployments made before versioning are identified by their
+        modelversion.txt stamp, or by the pickle's mtime and size.
+        """
+        version = versions.current_version()
+        if version is not None:
+            return version
+        try:
+            with open(os.path.join(self.deployment_path, 'modelversion.txt'), 'r') as f:
+                return 'legacy-' + f.read().strip()
+        except FileNotFoundError:
+            stat = os.stat(os.path.join(self.deployment_path, 'trainedmodel.pkl'))
+            return f"legacy-{stat.st_mtime_ns}-{stat.st_size}"
+
+    def version_path(self, version):
+        """Return the directory holding a version's files; legacy versions live in the deployment folder."""
+        if version.startswith('legacy-'):
+            return self.deployment_path
+        return versions.version_path(version)
+
+    def load_scorer(self, version):
+        # Version directories are immutable, so the files read here all belong to version
+        path = self.version_path(version)
+        params_file = os.path.join(path, 'modelparams.json')
+        if os.path.exists(params_file):
+            return LinearScorer.load(params_file)
+        with open(os.path.join(path, 'trainedmodel.pkl'), 'rb') as f:
+            return LinearScorer.from_model(pickle.load(f))
+
+    def get(self):
+        version = self.deployed_version()
+        current = self._current
+        if current is not None and current.version == version:
+            return current
+
+        # Only one thread reloads; the others wait and reuse its result
+        with self._lock:
+            current = self._current
+            if current is None or current.version != version:
+                current = DeployedModel(version, self.load_scorer(version))
+                self._current = current
+                print(f"Loaded deployed model version {version}")
+        return current
+
+
+deployed_model = ModelRegistry()
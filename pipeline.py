@@ -0,0 +1,82 @@
+import os
+import pickle
+import threading
+
+import datastore
+import versions
+from artifacts import file_stamp
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+test_data_path = os.path.join(config['test_data_path'])
+model_path = os.path.join(config['output_model_path'])
+
+test_data_file = os.path.join(test_data_path, 'testdata.csv')
+
+
+def model_file(kind):
+    """Return the pickle of the 'trained' model or of the currently served deployment."""
+    if kind == 'deployed':
+        return versions.deployed_file('trainedmodel.pkl')
+    return os.path.join(model_path, 'trainedmodel.pkl')
+
+
+##################Artifacts shared by the stages of one pipeline run
+class PipelineContext:
+    """Load each dataset and model of a pipeline run at most once.
+
+    Stages read tables and models through the context and hand the models
+    they produce back to it, so later stages use them from memory instead
+    of re-reading files. Every entry remembers the stat of the file it came
+    from and is reloaded once the file is rewritten, so a long-running
+    process can keep one context across runs. Stages running concurrently
+    share one load. The returned DataFrames are shared and must not be
+    modified in place.
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.models = {}
+        # Source files changed since the deployed data was ingested, found before the stages run
+        self.source_changes = None
+        self._lock = threading.RLock()
+
+    def read_table(self, path, columns=None):
+        with self._lock:
+            stamp = file_stamp(path)
+            if path not in self.tables or self.tables[path][0] != stamp:
+                self.tables[path] = (stamp, datastore.read_table(path))
+            table = self.tables[path][1]
+        return table[columns] if columns is not None else table
+
+    def test_data(self):
+        return self.read_table(test_data_file)
+
+    def dataset(self, columns=None):
+        return self.read_table(datastore.current_dataset_file(), columns=columns)
+
+    def dataset_changed(self):
+        """Forget the ingested dataset after ingestion rewrote it."""
+        with self._lock:
+            for fmt in datastore.file_extensions:
+                self.tables.pop(datastore.dataset_file(fmt), None)
+
+    def model(self, kind):
+        """Return the 'trained' or 'deployed' model, unpickling it only if no stage produced it."""
+        with self._lock:
+            path = model_file(kind)
+            stamp = file_stamp(path)
+            if kind not in self.models or self.models[kind][0] != stamp:
+                with open(path, 'rb') as f:
+                    self.models[kind] = (stamp, pickle.load(f))
+            return self.models[kind][1]
+
+    def set_model(self, kind, model):
+        """Hold a model a stage just wrote to its pickle file."""
+        with self._lock:
+            self.models[kind] = (file_stamp(model_file(kind)), model)
+
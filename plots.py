@@ -0,0 +1,127 @@
+import os
+import json
+import hashlib
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+model_path = os.path.join(config['output_model_path'])
+plot_keys_file = os.path.join(model_path, 'plotkeys.json')
+# 'background' draws changed plots on a worker thread, 'sync' draws them before returning,
+# and 'json' (for cron runs) only writes the matrices as JSON and never imports matplotlib
+confusion_matrix_plots = config.get('confusion_matrix_plots', 'background')
+class_labels = ['Not Exited', 'Exited']
+
+_lock = threading.Lock()
+_executor = None
+
+
+##################Plot keys: the values each saved plot was drawn from
+def plot_key(entry):
+    return hashlib.blake2b(json.dumps(entry, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def load_plot_keys():
+    try:
+        with open(plot_keys_file, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def is_current(plot_path, key):
+    """Return whether the plot on disk was drawn from exactly these values."""
+    return load_plot_keys().get(os.path.basename(plot_path)) == key and os.path.exists(plot_path)
+
+
+def record_plot_key(plot_path, key):
+    with _lock:
+        keys = load_plot_keys()
+        keys[os.path.basename(plot_path)] = key
+        with open(plot_keys_file + '.tmp', 'w') as f:
+            json.dump(keys, f, indent=2)
+        os.replace(plot_keys_file + '.tmp', plot_keys_file)
+
+
+##################Rendering with the Agg backend
+def draw_confusion_matrix(plot_path, entry, key):
+    """Draw the confusion matrix heatmap to plot_path, unless an identical one is already there."""
+    if is_current(plot_path, key):
+        return
+    # Draw on an Agg canvas directly: headless, and no pyplot state shared between threads
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    import seaborn as sns
+
+    fig = Figure(figsize=(8, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    sns.heatmap(entry['confusion_matrix'], annot=True, fmt='d', cmap='Blues',
+                xticklabels=entry['labels'], yticklabels=entry['labels'], ax=ax)
+    ax.set_xlabel('Predicted')
+    ax.set_ylabel('Actual')
+    ax.set_title(entry['title'])
+
+    # Write next to the target and rename, so readers never see a partial image
+    fig.savefig(plot_path + '.tmp.png')
+    os.replace(plot_path + '.tmp.png', plot_path)
+    record_plot_key(plot_path, key)
+    print(f"Confusion matrix plot saved to {os.path.basename(plot_path)}")
+
+
+def render_executor():
+    """Return the worker thread that draws plots, started on first use."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='plots')
+        return _executor
+
+
+def report_failure(future):
+    error = future.exception()
+    if error is not None:
+        print("Drawing a confusion matrix plot failed")
+        traceback.print_exception(type(error), error, error.__traceback__)
+
+
+def save_confusion_matrix(plot_file, title, matrix, mode=None):
+    """Save a confusion matrix as JSON and have its plot redrawn if the values changed.
+
+    The JSON file (plot_file with a .json suffix) is written before this
+    returns. In background mode the plot is drawn on the worker thread and
+    the returned future completes once it is saved; otherwise None is returned.
+    """
+    mode = mode or confusion_matrix_plots
+    plot_path = os.path.join(model_path, plot_file)
+    entry = {'title': title, 'labels': class_labels, 'confusion_matrix': matrix}
+
+    # Create output directory if it doesn't exist
+    os.makedirs(model_path, exist_ok=True)
+
+    json_path = os.path.splitext(plot_path)[0] + '.json'
+    with open(json_path + '.tmp', 'w') as f:
+        json.dump(entry, f, indent=2)
+    os.replace(json_path + '.tmp', json_path)
+
+    key = plot_key(entry)
+    if mode == 'json':
+        print(f"Confusion matrix saved to {os.path.basename(json_path)}: {matrix}")
+        return None
+    if is_current(plot_path, key):
+        print(f"Confusion matrix unchanged, keeping {plot_file}")
+        return None
+    if mode == 'sync':
+        draw_confusion_matrix(plot_path, entry, key)
+        return None
+
+    future = render_executor().submit(draw_confusion_matrix, plot_path, entry, key)
+    future.add_done_callback(report_failure)
+    return future
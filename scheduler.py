@@ -0,0 +1,155 @@
+import os
+import json
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from artifacts import file_fingerprint
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+model_path = os.path.join(config['output_model_path'])
+pipeline_state_file = os.path.join(model_path, 'pipeline_state.json')
+
+
+# A pipeline stage: run(context) reads the input artifacts and writes the output
+# artifacts; `after` orders it behind stages it shares no artifact with
+Stage = namedtuple('Stage', ['name', 'run', 'inputs', 'outputs', 'after'], defaults=[()])
+
+
+##################Dependency graph of pipeline stages
+class PipelineScheduler:
+    """Run pipeline stages in dependency order, skipping those whose inputs did not change.
+
+    A stage depends on every stage that writes one of its inputs, or a file
+    inside an input directory. The content hashes of a stage's inputs are
+    recorded in pipeline_state.json after each successful run. The next run
+    skips the stage when those hashes match and all its outputs still exist.
+    Stages whose dependencies have finished run concurrently.
+    """
+
+    def __init__(self, stages, state_file=pipeline_state_file, max_workers=4):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_file = state_file
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.dependencies = {
+            stage.name: {other.name for other in stages
+                         if other is not stage and (set(stage.after) & {other.name}
+                                                    or any(produces(output, path)
+                                                           for output in other.outputs
+                                                           for path in stage.inputs))}
+            for stage in stages
+        }
+
+    def load_state(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+        with open(self.state_file + '.tmp', 'w') as f:
+            json.dump(state, f, indent=4)
+        os.replace(self.state_file + '.tmp', self.state_file)
+
+    def fingerprint_inputs(self, stage, previous):
+        """Fingerprint every input file, rehashing only those whose size or mtime moved."""
+        fingerprints = {}
+        for path in stage.inputs:
+            for file in expand(path):
+                fingerprints[file] = (file_fingerprint(file, previous.get(file))
+                                      if os.path.exists(file) else None)
+        return fingerprints
+
+    def is_up_to_date(self, stage, last_run, fingerprints):
+        if last_run is None:
+            return False
+        last_hashes = {file: fp and fp['hash'] for file, fp in last_run['inputs'].items()}
+        hashes = {file: fp and fp['hash'] for file, fp in fingerprints.items()}
+        return hashes == last_hashes and all(os.path.exists(output) for output in stage.outputs)
+
+    def check(self, stage, state=None):
+        """Return whether stage is up to date, and the fingerprints of its inputs to record."""
+        state = self.load_state() if state is None else state
+        last_run = state.get(stage.name)
+        fingerprints = self.fingerprint_inputs(stage, last_run['inputs'] if last_run else {})
+        return self.is_up_to_date(stage, last_run, fingerprints), fingerprints
+
+    def record(self, stage, fingerprints, state=None):
+        """Record the inputs a stage consumed, so an unchanged rerun can be skipped."""
+        with self._lock:
+            state = self.load_state() if state is None else state
+            state[stage.name] = {'inputs': fingerprints, 'finished': datetime.now().isoformat()}
+            self.save_state(state)
+
+    def run_stage(self, stage, context, state, force):
+        up_to_date, fingerprints = self.check(stage, state)
+        if stage.name not in force and up_to_date:
+            print(f"Skipping {stage.name}: inputs unchanged since {state[stage.name]['finished']}")
+            return 'skipped'
+
+        print(f"\nRunning {stage.name}...")
+        stage.run(context)
+        self.record(stage, fingerprints, state)
+        return 'ran'
+
+    def run(self, context=None, force=()):
+        """Run every stage once and return each stage's outcome: 'ran', 'skipped' or 'failed'."""
+        state = self.load_state()
+        outcomes = {}
+        errors = []
+        pending = dict(self.stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Start every stage whose dependencies are done; drop those behind a failure
+                progressed = False
+                for name, stage in list(pending.items()):
+                    if any(outcomes.get(dep) == 'failed' for dep in self.dependencies[name]):
+                        outcomes[name] = 'failed'
+                    elif all(dep in outcomes for dep in self.dependencies[name]):
+                        running[executor.submit(self.run_stage, stage, context, state, force)] = name
+                    else:
+                        continue
+                    del pending[name]
+                    progressed = True
+
+                if not running:
+                    if not progressed:
+                        raise ValueError(f"Dependency cycle between stages: {sorted(pending)}")
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        outcomes[name] = future.result()
+                    except Exception as e:
+                        print(f"Stage {name} failed: {e}")
+                        outcomes[name] = 'failed'
+                        errors.append(e)
+
+        if errors:
+            raise errors[0]
+        return outcomes
+
+
+def expand(path):
+    """Return the files a declared artifact stands for: the file itself or a directory's files."""
+    if os.path.isdir(path):
+        return [os.path.join(path, file) for file in sorted(os.listdir(path))
+                if os.path.isfile(os.path.join(path, file))]
+    return [path]
+
+
+def produces(output, path):
+    """Return whether writing output changes the artifact at path."""
+    return output == path or output.startswith(path.rstrip(os.sep) + os.sep)
@@ -1,19 +1,16 @@
-from flask import Flask, session, jsonify, request
-import pandas as pd
-import numpy as np
 import pickle
 import os
-from sklearn import metrics
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-import json
-from datetime import datetime
+
+import datastore
+from evaluation import evaluate_model
+from metricstore import metrics_store
+from versions import deployed_file, deployed_version
+from settings import load_config
 
 
 
 #################Load config.json and get path variables
-with open('config.json','r') as f:
-    config = json.load(f) 
+config = load_config()
 
 dataset_csv_path = os.path.join(config['output_folder_path']) 
 test_data_path = os.path.join(config['test_data_path']) 
@@ -21,52 +18,52 @@ model_path = os.path.join(config['output_model_path'])
 
 
 #################Function for model scoring
-def score_model(use_deployed_model=False, dataset_path=None):
+def score_model(use_deployed_model=False, dataset_path=None, context=None):
+    # Read tables through the pipeline context when one is given, so each is loaded once per run
+    read_table = context.read_table if context is not None else datastore.read_table
+    
     # Load the data
     if use_deployed_model:
         # Always use test data for drift detection
-        data = pd.read_csv(os.path.join(test_data_path, 'testdata.csv'))
+        data = read_table(os.path.join(test_data_path, 'testdata.csv'))
         print("Using test data for drift detection...")
     else:
         if dataset_path:
-            data = pd.read_csv(dataset_path)
+            data = read_table(dataset_path)
             print(f"Using dataset from {dataset_path} for scoring...")
         else:
-            data = pd.read_csv(os.path.join(test_data_path, 'testdata.csv'))
+            data = read_table(os.path.join(test_data_path, 'testdata.csv'))
             print("Using test data for scoring...")
     
     # Prepare features and target
     X = data[['lastmonth_activity', 'lastyear_activity', 'number_of_employees']]
     y = data['exited']
     
-    # Load the model from either deployment or training directory
+    # Load the model from either the served deployment or the training directory
     if use_deployed_model:
-        model_path = config['prod_deployment_path']
+        model_file = deployed_file('trainedmodel.pkl')
         print("Using deployed model for scoring...")
     else:
-        model_path = config['output_model_path']
+        model_file = os.path.join(model_path, 'trainedmodel.pkl')
         print("Using trained model for scoring...")
     
-    with open(os.path.join(model_path, 'trainedmodel.pkl'), 'rb') as f:
-        model = pickle.load(f)
-    
-    # Make predictions
-    y_pred = model.predict(X)
-    
-    # Calculate F1 score
-    f1_score = metrics.f1_score(y, y_pred)
+    if context is not None:
+        model = context.model('deployed' if use_deployed_model else 'trained')
+    else:
+        with open(model_file, 'rb') as f:
+            model = pickle.load(f)
     
-    # Save the score with timestamp to CSV
-    timestamp = datetime.now().isoformat()
-    df_scores = pd.DataFrame({
-        'timestamp': [timestamp],
-        'f1_score': [f1_score],
-        'model_type': ['deployed' if use_deployed_model else 'trained'],
-        'dataset': [os.path.basename(dataset_path) if dataset_path else 'testdata.csv']
-    })
+    # Score the rows once; every metric comes from the same pass
+    results = evaluate_model(model, X, y)
+    f1_score = results['f1_score']
     
-    scores_file = os.path.join(model_path, 'model_scores.csv')
-    df_scores.to_csv(scores_file, mode='a', header=not os.path.exists(scores_file), index=False)
+    # Append the score to the metrics history
+    metrics_store.record(
+        'scoring', {'f1_score': f1_score},
+        model_type='deployed' if use_deployed_model else 'trained',
+        model_version=deployed_version() if use_deployed_model else None,
+        dataset=os.path.basename(dataset_path) if dataset_path else 'testdata.csv'
+    )
     
     # Also save the latest score to txt for backward compatibility
     if not use_deployed_model:
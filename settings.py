@@ -0,0 +1,11 @@
+import json
+import functools
+
+
+
+##################Cached config.json loader
+@functools.lru_cache(maxsize=None)
+def load_config(path='config.json'):
+    """Parse config.json once per process; every module shares the returned dict."""
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,25 @@
+#!/bin/bash
+
+# Get the absolute path of the project directory
+PROJECT_DIR=$(pwd)
+
+# Get pyenv root and python version
+PYENV_ROOT="$HOME/.pyenv"
+PYTHON_VERSION=$(cat .python-version)
+
+# The daemon replaces the 3-minute cron poll: it keeps the pipeline loaded and
+# runs it as soon as new data lands in the input folder.
+# We need to:
+# 1. Set up pyenv environment
+# 2. Activate the correct Python version
+# 3. Start the daemon in the background
+DAEMON_CMD="export PYENV_ROOT=\"$PYENV_ROOT\"; export PATH=\"\$PYENV_ROOT/bin:\$PATH\"; eval \"\$(pyenv init --path)\"; eval \"\$(pyenv init -)\"; cd $PROJECT_DIR && pyenv shell $PYTHON_VERSION && nohup python daemon.py >> $PROJECT_DIR/daemon.log 2>&1 &"
+
+# Start the daemon again after a reboot, and remove the polling cron job if it was set up
+(crontab -l 2>/dev/null | grep -v "fullprocess.py"; echo "@reboot $DAEMON_CMD") | crontab -
+
+# Start it now
+bash -c "$DAEMON_CMD"
+
+echo "Daemon started using pyenv environment: $PYTHON_VERSION"
+echo "Logs will be written to $PROJECT_DIR/daemon.log"
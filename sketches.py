@@ -0,0 +1,253 @@
+import os
+import json
+import math
+import numpy as np
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+dataset_csv_path = os.path.join(config['output_folder_path'])
+dataset_profile_file = os.path.join(dataset_csv_path, 'dataprofile.json')
+sketch_columns = config['numeric_columns'] + [config['target_column']]
+# Relative error of sketch quantiles; also sets the bucket width used for drift
+sketch_relative_accuracy = config.get('sketch_relative_accuracy', 0.01)
+# Quantiles reported in a dataset profile
+profile_quantiles = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+
+##################Mergeable sketch of one numeric column
+class ColumnSketch:
+    """Moments and a histogram of a column over logarithmically spaced buckets.
+
+    Every sketch with the same relative accuracy shares one bucket grid, so
+    sketches of different chunks or datasets merge by adding counts and can
+    be compared bucket by bucket. Mean and variance are merged with Chan's
+    parallel update. Memory depends on the value range, not on the number
+    of rows.
+    """
+
+    def __init__(self, relative_accuracy=sketch_relative_accuracy):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.zero = 0
+        self.positive = {}
+        self.negative = {}
+
+    def _merge_moments(self, count, mean, m2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        is_missing = np.isnan(values)
+        values = values[~is_missing]
+        self.missing += int(is_missing.sum())
+        if len(values) == 0:
+            return self
+
+        mean = values.mean()
+        self._merge_moments(len(values), mean, float(((values - mean) ** 2).sum()))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.zero += int((values == 0).sum())
+
+        for sign, buckets in ((1, self.positive), (-1, self.negative)):
+            magnitudes = values[sign * values > 0] * sign
+            keys, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64),
+                                     return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                buckets[key] = buckets.get(key, 0) + count
+        return self
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        if other.count:
+            self._merge_moments(other.count, other.mean, other.m2)
+        self.missing += other.missing
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero += other.zero
+        for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        return self
+
+    @property
+    def std(self):
+        """Sample standard deviation, as pandas computes it."""
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float('nan')
+
+    def bucket_value(self, key):
+        """Return the value representing a bucket, within the relative accuracy of its members."""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def points(self):
+        """Return bucket values in ascending order with their counts."""
+        negative = sorted(self.negative, reverse=True)
+        positive = sorted(self.positive)
+        values = ([-self.bucket_value(key) for key in negative]
+                  + ([0.0] if self.zero else [])
+                  + [self.bucket_value(key) for key in positive])
+        counts = ([self.negative[key] for key in negative]
+                  + ([self.zero] if self.zero else [])
+                  + [self.positive[key] for key in positive])
+        return np.array(values, dtype=np.float64), np.array(counts, dtype=np.int64)
+
+    def cdf(self, x):
+        """Return the fraction of values at or below each x, at bucket resolution."""
+        values, counts = self.points()
+        cumulative = np.concatenate([[0], np.cumsum(counts)]) / max(self.count, 1)
+        return cumulative[np.searchsorted(values, x, side='right')]
+
+    def quantile(self, q):
+        if self.count == 0:
+            return float('nan')
+        values, counts = self.points()
+        rank = q * (self.count - 1)
+        value = float(values[np.searchsorted(np.cumsum(counts), rank, side='right')])
+        # Bucket values can overshoot the observed range by the relative accuracy
+        return min(max(value, self.min), self.max)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'missing': self.missing,
+            'mean': self.mean if self.count else None,
+            'std': self.std if self.count > 1 else None,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'quantiles': {str(q): self.quantile(q) for q in profile_quantiles} if self.count else {},
+            'histogram': {
+                'relative_accuracy': self.relative_accuracy,
+                'm2': self.m2,
+                'zero': self.zero,
+                'positive': {str(key): count for key, count in self.positive.items()},
+                'negative': {str(key): count for key, count in self.negative.items()}
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = data['histogram']
+        sketch = cls(histogram['relative_accuracy'])
+        sketch.count, sketch.missing = data['count'], data['missing']
+        if sketch.count:
+            sketch.mean, sketch.min, sketch.max = data['mean'], data['min'], data['max']
+        sketch.m2, sketch.zero = histogram['m2'], histogram['zero']
+        sketch.positive = {int(key): count for key, count in histogram['positive'].items()}
+        sketch.negative = {int(key): count for key, count in histogram['negative'].items()}
+        return sketch
+
+
+##################Profile of a whole dataset
+class DatasetProfile:
+    """Row count, missing values per column and a sketch of every numeric column.
+
+    Built chunk by chunk at ingestion and persisted as JSON, so summary
+    statistics, missing-value rates and drift are read in O(columns)
+    without touching the dataset.
+    """
+
+    def __init__(self, columns=None):
+        self.rows = 0
+        self.missing = {}
+        self.columns = {col: ColumnSketch() for col in (columns or sketch_columns)}
+
+    def update(self, df):
+        self.rows += len(df)
+        for col, count in df.isna().sum().items():
+            self.missing[col] = self.missing.get(col, 0) + int(count)
+        for col, sketch in self.columns.items():
+            if col in df.columns:
+                sketch.update(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        for col, count in other.missing.items():
+            self.missing[col] = self.missing.get(col, 0) + count
+        for col, sketch in other.columns.items():
+            self.columns.setdefault(col, ColumnSketch(sketch.relative_accuracy)).merge(sketch)
+        return self
+
+    def missing_rates(self):
+        """Return the fraction of missing values in every column, in dataset order."""
+        return {col: count / self.rows if self.rows else 0.0 for col, count in self.missing.items()}
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'missing': self.missing,
+            'missing_rates': self.missing_rates(),
+            'columns': {col: sketch.to_dict() for col, sketch in self.columns.items()}
+        }
+
+    def save(self, path):
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        profile = cls(columns=[])
+        profile.rows = data['rows']
+        profile.missing = data['missing']
+        profile.columns = {col: ColumnSketch.from_dict(column) for col, column in data['columns'].items()}
+        return profile
+
+
+def load_or_build(path, load_data):
+    """Load a persisted dataset profile, or build it once from load_data() and persist it."""
+    try:
+        return DatasetProfile.load(path)
+    except FileNotFoundError:
+        profile = DatasetProfile().update(load_data())
+        profile.save(path)
+        return profile
+
+
+##################Drift statistics computed from sketches alone
+def ks_statistic(reference, current):
+    """Return the approximate two-sample KS statistic and its asymptotic p-value.
+
+    The CDFs are compared at every bucket of either sketch, so the statistic
+    is accurate to the bucket resolution rather than to individual values.
+    """
+    if reference.count == 0 or current.count == 0:
+        return float('nan'), float('nan')
+    values = np.union1d(reference.points()[0], current.points()[0])
+    statistic = float(np.max(np.abs(reference.cdf(values) - current.cdf(values))))
+
+    # Same asymptotic distribution scipy.stats.ks_2samp uses for large samples
+    from scipy.stats import kstwo
+    n, m = reference.count, current.count
+    p_value = float(kstwo.sf(statistic, round(n * m / (n + m))))
+    return statistic, min(max(p_value, 0.0), 1.0)
+
+
+def population_stability_index(reference, current, bins=10, epsilon=1e-4):
+    """Return the PSI of current against reference over the reference's quantile bins."""
+    if reference.count == 0 or current.count == 0:
+        return float('nan')
+    edges = np.unique([reference.quantile(q) for q in np.linspace(0, 1, bins + 1)[1:-1]])
+    reference_share = np.diff(np.concatenate([[0], reference.cdf(edges), [1]]))
+    current_share = np.diff(np.concatenate([[0], current.cdf(edges), [1]]))
+    reference_share = np.clip(reference_share, epsilon, None)
+    current_share = np.clip(current_share, epsilon, None)
+    return float(np.sum((current_share - reference_share) * np.log(current_share / reference_share)))
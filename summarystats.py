@@ -0,0 +1,84 @@
+import os
+import json
+import threading
+import numpy as np
+
+import datastore
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+dataset_csv_path = os.path.join(config['output_folder_path'])
+summary_cache_file = os.path.join(dataset_csv_path, 'summarystats.json')
+
+
+##################Function to compute the statistics in one pass
+def compute_summary(data):
+    """Return mean, median and std of every numeric column plus NA percentages of every column."""
+    numeric = data.select_dtypes(include=[np.number]).to_numpy(dtype=np.float64, na_value=np.nan)
+    stats = np.column_stack([
+        np.nanmean(numeric, axis=0),
+        np.nanmedian(numeric, axis=0),
+        np.nanstd(numeric, axis=0, ddof=1)
+    ])
+    return {
+        'summary_statistics': stats.ravel().tolist(),
+        'missing_percentages': (data.isna().to_numpy().mean(axis=0) * 100).tolist()
+    }
+
+
+##################Cache of the statistics keyed on the dataset file
+class SummaryCache:
+    """Keep the summary statistics of the ingested dataset in memory and on disk.
+
+    Entries are keyed on the dataset file's path, inode, mtime and size.
+    Ingestion replaces the file when it rewrites it, which changes the key,
+    so a stale entry is never served. On a miss only one thread reads the
+    dataset; concurrent callers wait for its result.
+    """
+
+    def __init__(self, cache_file=summary_cache_file):
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._current = None
+
+    def dataset_key(self):
+        path = datastore.current_dataset_file()
+        stat = os.stat(path)
+        return [path, stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+    def load_cached(self, key):
+        try:
+            with open(self.cache_file, 'r') as f:
+                cached = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return cached if cached.get('key') == key else None
+
+    def save(self, entry):
+        with open(self.cache_file + '.tmp', 'w') as f:
+            json.dump(entry, f)
+        os.replace(self.cache_file + '.tmp', self.cache_file)
+
+    def get(self):
+        key = self.dataset_key()
+        current = self._current
+        if current is not None and current['key'] == key:
+            return current
+
+        # Only one thread recomputes; the others wait and reuse its result
+        with self._lock:
+            current = self._current
+            if current is None or current['key'] != key:
+                current = self.load_cached(key)
+                if current is None:
+                    current = {'key': key, **compute_summary(datastore.load_dataset())}
+                    self.save(current)
+                self._current = current
+        return current
+
+
+summary_cache = SummaryCache()
@@ -0,0 +1,91 @@
+import os
+import pickle
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+import datastore
+import versions
+from fastpredict import LinearScorer, check_parity, feature_columns, parity_atol, test_data_path
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+target_column = config['target_column']
+test_file = os.path.join(test_data_path, 'testdata.csv')
+
+
+def final_data_file():
+    """Return the ingested dataset in its columnar format, or its csv export."""
+    return datastore.dataset_file() if datastore.dataset_exists() else datastore.dataset_file('csv')
+
+
+def exported(scorer):
+    """Round-trip a scorer through modelparams.json, as deployment and the API do."""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'modelparams.json')
+        scorer.save(path)
+        return LinearScorer.load(path)
+
+
+##################Parity of the NumPy scorer with the pickled model
+class ScorerParityTest(unittest.TestCase):
+    """Run from the repository root: python -m unittest test_fastpredict"""
+
+    def setUp(self):
+        self.paths = [test_file, final_data_file()]
+        missing = [path for path in self.paths if not os.path.exists(path)]
+        if missing:
+            self.skipTest(f"No data to check parity on: {missing}")
+
+    def fit(self, **params):
+        from sklearn.linear_model import LogisticRegression
+        data = datastore.read_table(final_data_file())
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return LogisticRegression(random_state=0, **params).fit(data[feature_columns], data[target_column])
+
+    def test_trained_models_match_on_test_and_final_data(self):
+        # The training defaults and the kinds of model the hyperparameter search picks
+        for params in [{'solver': 'liblinear', 'penalty': 'l2'},
+                       {'solver': 'liblinear', 'penalty': 'l1', 'C': 0.1, 'class_weight': 'balanced'},
+                       {'solver': 'lbfgs', 'penalty': 'l2', 'C': 10.0, 'max_iter': 1000}]:
+            with self.subTest(**params):
+                model = self.fit(**params)
+                check_parity(model, exported(LinearScorer.from_model(model)), self.paths)
+
+    def test_integer_features_match(self):
+        model = self.fit(solver='liblinear')
+        scorer = exported(LinearScorer.from_model(model))
+        for path in self.paths:
+            X = datastore.read_table(path)[feature_columns].round().astype(np.int64)
+            np.testing.assert_array_equal(model.predict(X), scorer.predict(X))
+            np.testing.assert_allclose(model.predict_proba(X), scorer.predict_proba(X), rtol=0, atol=parity_atol)
+
+    def test_rounding_differences_are_tolerated(self):
+        model = self.fit(solver='liblinear')
+        scorer = LinearScorer.from_model(model)
+        # One ULP off in every coefficient is within tolerance; a real change is not
+        scorer.coef = np.nextafter(scorer.coef, np.inf)
+        check_parity(model, scorer, self.paths)
+        scorer.coef = scorer.coef * 1.01
+        with self.assertRaises(ValueError):
+            check_parity(model, scorer, self.paths)
+
+    def test_deployed_scorer_matches_deployed_model(self):
+        version = versions.current_version()
+        params_file = versions.deployed_file('modelparams.json', version)
+        if version is None or not os.path.exists(params_file):
+            self.skipTest("No versioned deployment with exported parameters")
+        with open(versions.deployed_file('trainedmodel.pkl', version), 'rb') as f:
+            model = pickle.load(f)
+        check_parity(model, LinearScorer.load(params_file), self.paths)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,29 +1,102 @@
-from flask import Flask, session, jsonify, request
-import pandas as pd
-import numpy as np
 import pickle
 import os
-from sklearn import metrics
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
 import json
+from datetime import datetime
+
+import datastore
+from settings import load_config
 
 ###################Load config.json and get path variables
-with open('config.json','r') as f:
-    config = json.load(f) 
+config = load_config()
 
 dataset_csv_path = os.path.join(config['output_folder_path']) 
 model_path = os.path.join(config['output_model_path']) 
+test_data_path = os.path.join(config['test_data_path'])
+feature_columns = config['numeric_columns']
+target_column = config['target_column']
+training_state_file = os.path.join(model_path, 'trainingstate.json')
+ingestion_manifest_file = os.path.join(dataset_csv_path, 'ingestedmanifest.json')
 
+# 'full' always refits from scratch, 'incremental' always continues from the last model
+# when rows were appended, and 'auto' lets choose_training_mode decide
+training_mode = config.get('training_mode', 'auto')
+# Refit from scratch once the appended rows exceed this fraction of the rows already trained on
+incremental_max_new_fraction = config.get('incremental_max_new_fraction', 0.25)
+# ... or once the score has dropped this far below the last full refit's
+incremental_max_score_drop = config.get('incremental_max_score_drop', 0.05)
+# ... or after this many incremental updates in a row
+incremental_max_generations = config.get('incremental_max_generations', 10)
+# Fraction of the rows already trained on that an incremental update refits on, with a floor;
+# the rest of the history is represented by a penalty toward the previous coefficients
+incremental_history_fraction = config.get('incremental_history_fraction', 0.2)
+incremental_history_min_rows = config.get('incremental_history_min_rows', 10000)
+# Full refits search the hyperparameters (tuning.py) instead of fitting the defaults
+hyperparameter_search = config.get('hyperparameter_search', True)
 
-#################Function for training the model
-def train_model():
-    # Read the training data
-    data = pd.read_csv(os.path.join(dataset_csv_path, 'finaldata.csv'))
+
+#################Training state kept between runs
+def load_training_state():
+    """Load what the last training run trained on, or None before the first run."""
+    try:
+        with open(training_state_file, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_training_state(state):
+    with open(training_state_file + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(training_state_file + '.tmp', training_state_file)
+
+
+def current_dataset_id():
+    """Return the id ingestion gives the dataset; it stays the same while rows are only appended."""
+    try:
+        with open(ingestion_manifest_file, 'r') as f:
+            return json.load(f).get('dataset_id')
+    except FileNotFoundError:
+        return None
+
+
+def read_latest_score():
+    try:
+        with open(os.path.join(model_path, 'latestscore.txt'), 'r') as f:
+            return float(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def choose_training_mode(state, rows, dataset_id, mode=training_mode):
+    """Return 'full' or 'incremental' for training on `rows` rows, with the reason."""
+    if mode == 'full':
+        return 'full', "training_mode is 'full'"
+    if state is None or not os.path.exists(os.path.join(model_path, 'trainedmodel.pkl')):
+        return 'full', "no previous model"
+    if dataset_id is None or state['dataset_id'] != dataset_id:
+        return 'full', "rows were rewritten or removed since the last training run"
     
-    # Prepare features and target
-    X = data[['lastmonth_activity', 'lastyear_activity', 'number_of_employees']]
-    y = data['exited']
+    new_rows = rows - state['rows']
+    if new_rows <= 0:
+        return 'full', "no rows were appended since the last training run"
+    if mode == 'incremental':
+        return 'incremental', "training_mode is 'incremental'"
+    
+    if new_rows > incremental_max_new_fraction * state['rows']:
+        return 'full', f"{new_rows} new rows exceed {incremental_max_new_fraction:.0%} of the history"
+    if state['generation'] >= incremental_max_generations:
+        return 'full', f"{state['generation']} incremental updates since the last full refit"
+    latest_score, full_score = read_latest_score(), state.get('full_score')
+    if latest_score is not None and full_score is not None and full_score - latest_score > incremental_max_score_drop:
+        return 'full', f"score dropped from {full_score:.4f} to {latest_score:.4f} since the last full refit"
+    return 'incremental', f"{new_rows} new rows"
+
+
+#################Function for training the model
+def fit_full(X, y):
+    """Fit a new model on a random 80% of the whole dataset."""
+    from sklearn.model_selection import train_test_split
+    from sklearn.linear_model import LogisticRegression
     
     # Split the data
     X_train, X_test, y_train, y_test = train_test_split(
@@ -40,13 +113,152 @@ def train_model():
     
     # Fit the model
     model.fit(X_train, y_train)
+    return model
+
+
+def can_update(model):
+    """Return whether fit_incremental can update the model: an L2-penalised binary logistic regression."""
+    return (getattr(model, 'penalty', None) == 'l2' and getattr(model, 'fit_intercept', False)
+            and len(getattr(model, 'classes_', ())) == 2)
+
+
+def fit_incremental(previous, X, y, trained_rows, generation):
+    """Update the previous model with the appended rows, anchored to what it learned before.
+
+    The update minimises the model's own objective (C times the class-weighted
+    log loss, plus its L2 penalty) over the new rows and a seeded sample of
+    the history. The history rows left out of the sample are stood in for by
+    a penalty toward the previous coefficients, weighted by the curvature of
+    their loss there (the diagonal Fisher information of the previous fit on
+    the sample, scaled to the rows left out), so the update cannot drift
+    where the history constrains the fit. With the whole history sampled it
+    is the full objective on all rows, started from the previous solution.
+    """
+    import numpy as np
+    from scipy.optimize import minimize
+    from scipy.special import expit
+    from sklearn.base import clone
+    from sklearn.utils.class_weight import compute_class_weight
+    
+    # All appended rows plus a seeded sample of the rows the previous model saw
+    rng = np.random.default_rng(generation)
+    sample_rows = min(trained_rows, max(incremental_history_min_rows,
+                                        int(trained_rows * incremental_history_fraction)))
+    sample = np.sort(rng.choice(trained_rows, size=sample_rows, replace=False))
+    rows = np.concatenate([sample, np.arange(trained_rows, len(X))])
+    
+    # Features with a constant column for the intercept, which is not penalised
+    A = np.column_stack([np.asarray(X, dtype=np.float64)[rows], np.ones(len(rows))])
+    positive = np.asarray(y)[rows] == previous.classes_[1]
+    class_weights = compute_class_weight(previous.class_weight, classes=previous.classes_, y=np.asarray(y))
+    weights = class_weights[positive.astype(int)]
+    previous_w = np.append(previous.coef_.ravel(), previous.intercept_)
+    
+    # Curvature of the left-out history's loss at the previous solution
+    in_sample = np.arange(sample_rows)
+    p = expit(A[in_sample] @ previous_w)
+    fisher = ((trained_rows - sample_rows) / sample_rows
+              * (weights[in_sample] * p * (1 - p)) @ A[in_sample] ** 2)
+    
+    C = previous.C
+    def objective(w):
+        z = A @ w
+        loss = C * weights @ (np.logaddexp(0, z) - positive * z)
+        gradient = C * A.T @ (weights * (expit(z) - positive))
+        shift = w - previous_w
+        loss += 0.5 * w[:-1] @ w[:-1] + 0.5 * C * fisher @ shift ** 2
+        gradient[:-1] += w[:-1]
+        gradient += C * fisher * shift
+        return loss, gradient
+    
+    # The loss is not averaged over rows, so converge on tight absolute tolerances
+    result = minimize(objective, previous_w, jac=True, method='L-BFGS-B',
+                      options={'maxiter': max(previous.max_iter, 100), 'ftol': 1e-12, 'gtol': 1e-10})
+    
+    # A model with the previous hyperparameters, holding the updated coefficients
+    model = clone(previous)
+    model.classes_ = previous.classes_
+    model.coef_ = result.x[None, :-1]
+    model.intercept_ = result.x[-1:]
+    model.n_iter_ = np.array([result.nit], dtype=np.int32)
+    model.n_features_in_ = previous.n_features_in_
+    if hasattr(previous, 'feature_names_in_'):
+        model.feature_names_in_ = previous.feature_names_in_
+    return model
+
+
+def holdout_score(model, context=None):
+    """Return the model's F1 score on the test data, as the scoring stage computes it, or None without test data."""
+    from evaluation import evaluate_model
+    test_file = os.path.join(test_data_path, 'testdata.csv')
+    if not os.path.exists(test_file):
+        return None
+    data = context.read_table(test_file) if context is not None else datastore.read_table(test_file)
+    return evaluate_model(model, data[feature_columns], data[target_column])['f1_score']
+
+
+def train_model(context=None, mode=training_mode):
+    # Read only the feature and target columns of the training data
+    if context is not None:
+        data = context.dataset(columns=feature_columns + [target_column])
+    else:
+        data = datastore.load_dataset(columns=feature_columns + [target_column])
+    
+    # Prepare features and target
+    X = data[feature_columns]
+    y = data[target_column]
+    
+    # The score after a full refit is the baseline incremental updates are held to
+    state = load_training_state()
+    if state is not None and state['mode'] == 'full' and state.get('full_score') is None:
+        state['full_score'] = read_latest_score()
+    
+    # Decide between continuing from the last model and refitting from scratch
+    dataset_id = current_dataset_id()
+    mode, reason = choose_training_mode(state, len(data), dataset_id, mode)
+    print(f"Training mode: {mode} ({reason})")
+    
+    if mode == 'incremental':
+        if context is not None:
+            previous = context.model('trained')
+        else:
+            with open(os.path.join(model_path, 'trainedmodel.pkl'), 'rb') as f:
+                previous = pickle.load(f)
+        
+        if not can_update(previous):
+            mode, reason = 'full', f"the last model ({previous.penalty} penalty) cannot be updated incrementally"
+        else:
+            model = fit_incremental(previous, X, y, state['rows'], state['generation'] + 1)
+            # Hold the update to the last full refit's score before it replaces the model
+            score, full_score = holdout_score(model, context), state.get('full_score')
+            if score is not None and full_score is not None and full_score - score > incremental_max_score_drop:
+                mode, reason = 'full', f"the update scored {score:.4f} against {full_score:.4f} for the last full refit"
+        
+        if mode == 'full':
+            print(f"Falling back to a full refit: {reason}")
+        else:
+            state = dict(state, rows=len(data), generation=state['generation'] + 1, mode='incremental')
+    
+    if mode == 'full':
+        if hyperparameter_search:
+            import tuning
+            model = tuning.best_model(X, y, dataset_id)
+        else:
+            model = fit_full(X, y)
+        state = {'dataset_id': dataset_id, 'rows': len(data), 'generation': 0,
+                 'mode': 'full', 'full_score': None}
     
     # Create output directory if it doesn't exist
     os.makedirs(model_path, exist_ok=True)
     
-    # Save the trained model
+    # Save the trained model and what it was trained on
     with open(os.path.join(model_path, 'trainedmodel.pkl'), 'wb') as f:
         pickle.dump(model, f)
+    save_training_state(dict(state, trained=datetime.now().isoformat()))
+    
+    # Hand the fitted model to later stages of the pipeline run
+    if context is not None:
+        context.set_model('trained', model)
     
     print(f"Model trained and saved to {os.path.join(model_path, 'trainedmodel.pkl')}")
     return model
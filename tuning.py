@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+model_path = os.path.join(config['output_model_path'])
+leaderboard_file = os.path.join(model_path, 'leaderboard.json')
+# Random candidates drawn from search_space; the current default is always evaluated as well
+tuning_candidates = config.get('tuning_candidates', 40)
+tuning_folds = config.get('tuning_folds', 5)
+# No new fold is started after this many seconds, so the search fits in the cron window
+tuning_time_budget_seconds = config.get('tuning_time_budget_seconds', 120)
+tuning_workers = config.get('tuning_workers') or os.cpu_count()
+tuning_seed = config.get('tuning_seed', 0)
+
+# Solver families searched, with the penalties each supports
+search_space = [
+    {'solver': 'liblinear', 'penalty': 'l2'},
+    {'solver': 'liblinear', 'penalty': 'l1'},
+    {'solver': 'lbfgs', 'penalty': 'l2'},
+    {'solver': 'newton-cg', 'penalty': 'l2'},
+    {'solver': 'saga', 'penalty': 'elasticnet'}
+]
+# The hyperparameters train_model used before the search existed
+default_params = {'solver': 'liblinear', 'penalty': 'l2', 'C': 1.0, 'class_weight': None}
+
+
+##################Candidates and models
+def sample_candidates(n=tuning_candidates, seed=tuning_seed):
+    """Return the default parameters followed by n random ones, cycling through the solver families."""
+    rng = np.random.default_rng(seed)
+    candidates = [dict(default_params)]
+    for i in range(n):
+        params = dict(search_space[i % len(search_space)])
+        params['C'] = float(10 ** rng.uniform(-3, 3))
+        params['class_weight'] = [None, 'balanced'][int(rng.integers(2))]
+        if params['penalty'] == 'elasticnet':
+            params['l1_ratio'] = float(rng.uniform(0, 1))
+        candidates.append(params)
+    return candidates
+
+
+def make_model(params):
+    from sklearn.linear_model import LogisticRegression
+    return LogisticRegression(max_iter=1000, random_state=0, **params)
+
+
+def assign_folds(y, folds=tuning_folds, seed=tuning_seed):
+    """Return the fold of every row, stratified by class; fewer folds if a class is too small."""
+    from sklearn.model_selection import StratifiedKFold
+    folds = max(2, min(folds, int(np.bincount(y).min())))
+    assignment = np.empty(len(y), dtype=np.int8)
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    for fold, (_, test) in enumerate(splitter.split(np.zeros(len(y)), y)):
+        assignment[test] = fold
+    return assignment
+
+
+##################Worker side: data mapped once per process
+worker_data = {}
+
+
+def init_worker(data_dir):
+    """Map the shared arrays read-only, so the dataset is never pickled to a worker."""
+    for name in ('X', 'y', 'folds'):
+        worker_data[name] = np.load(os.path.join(data_dir, name + '.npy'), mmap_mode='r')
+
+
+def evaluate_fold(index, params, fold):
+    """Fit params on every fold but one and return the F1 score on that fold."""
+    from sklearn.metrics import f1_score
+    X, y, folds = worker_data['X'], worker_data['y'], worker_data['folds']
+    train = folds != fold
+    start = time.perf_counter()
+    with warnings.catch_warnings():
+        # Non-converging candidates still get a score; they just rank low
+        warnings.simplefilter('ignore')
+        model = make_model(params).fit(X[train], y[train])
+    score = f1_score(y[~train], model.predict(X[~train]), zero_division=0)
+    return index, fold, float(score), time.perf_counter() - start
+
+
+##################Search
+def run_search(X, y, candidates=None, budget=tuning_time_budget_seconds, workers=tuning_workers):
+    """Cross-validate every candidate across a process pool and return the leaderboard.
+
+    Each (candidate, fold) pair is one task, so all cores stay busy even
+    with few candidates. Tasks already running when the budget runs out
+    finish; the rest are dropped, and only candidates with every fold
+    scored are ranked.
+    """
+    candidates = sample_candidates() if candidates is None else candidates
+    y = np.asarray(y, dtype=np.int64)
+    folds = assign_folds(y)
+    n_folds = int(folds.max()) + 1
+    deadline = time.monotonic() + budget
+
+    # Write the arrays once; every worker maps the same pages
+    data_dir = tempfile.mkdtemp(prefix='tuning-')
+    try:
+        np.save(os.path.join(data_dir, 'X.npy'), np.ascontiguousarray(X, dtype=np.float64))
+        np.save(os.path.join(data_dir, 'y.npy'), y)
+        np.save(os.path.join(data_dir, 'folds.npy'), folds)
+
+        tasks = iter([(index, params, fold) for index, params in enumerate(candidates)
+                      for fold in range(n_folds)])
+        scores = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(data_dir,)) as executor:
+            running = set()
+            while True:
+                # Keep every worker busy until the budget runs out
+                while len(running) < 2 * workers and time.monotonic() < deadline:
+                    task = next(tasks, None)
+                    if task is None:
+                        break
+                    running.add(executor.submit(evaluate_fold, *task))
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, fold, score, seconds = future.result()
+                    scores.setdefault(index, {})[fold] = (score, seconds)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    leaderboard = []
+    for index, fold_scores in sorted(scores.items()):
+        if len(fold_scores) < n_folds:
+            continue
+        values = [fold_scores[fold][0] for fold in range(n_folds)]
+        leaderboard.append({
+            'params': candidates[index],
+            'mean_f1': float(np.mean(values)),
+            'std_f1': float(np.std(values)),
+            'fold_f1': values,
+            'fit_seconds': float(sum(seconds for _, seconds in fold_scores.values()))
+        })
+    # Best mean first; ties go to the steadier, then the earlier candidate, so the defaults win ties
+    leaderboard.sort(key=lambda entry: (-entry['mean_f1'], entry['std_f1']))
+    if len(leaderboard) < len(candidates):
+        print(f"Time budget of {budget}s reached: {len(leaderboard)} of {len(candidates)} candidates evaluated")
+    return leaderboard, n_folds
+
+
+##################Leaderboard kept between runs
+def load_leaderboard():
+    try:
+        with open(leaderboard_file, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_leaderboard(entry):
+    os.makedirs(model_path, exist_ok=True)
+    with open(leaderboard_file + '.tmp', 'w') as f:
+        json.dump(entry, f, indent=2)
+    os.replace(leaderboard_file + '.tmp', leaderboard_file)
+
+
+def search_key(dataset_id, rows):
+    """Identify a search by the data and settings it ran with; equal keys give equal results."""
+    return {'dataset_id': dataset_id, 'rows': rows, 'candidates': tuning_candidates,
+            'folds': tuning_folds, 'seed': tuning_seed}
+
+
+def best_model(X, y, dataset_id=None):
+    """Search the hyperparameters, then promote the winner by refitting it on all rows.
+
+    The search is reused when the leaderboard was computed for the same
+    dataset and settings, so a refit on unchanged data only fits one model.
+    """
+    key = search_key(dataset_id, len(y))
+    cached = load_leaderboard()
+    if dataset_id is not None and cached and cached['key'] == key and cached['complete']:
+        print("Reusing the hyperparameter search of this dataset")
+        leaderboard = cached['leaderboard']
+    else:
+        start = time.perf_counter()
+        candidates = sample_candidates()
+        leaderboard, n_folds = run_search(X, y, candidates)
+        save_leaderboard({
+            'key': key,
+            'finished': datetime.now().isoformat(),
+            'seconds': time.perf_counter() - start,
+            'folds': n_folds,
+            'complete': len(leaderboard) == len(candidates),
+            'leaderboard': leaderboard
+        })
+
+    print("\nHyperparameter leaderboard (mean F1 over folds):")
+    for rank, entry in enumerate(leaderboard[:5], 1):
+        print(f"{rank}. {entry['mean_f1']:.4f} ± {entry['std_f1']:.4f}  {entry['params']}")
+
+    params = leaderboard[0]['params'] if leaderboard else default_params
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return make_model(params).fit(X, y)
+
+
+if __name__ == '__main__':
+    import datastore
+    import training
+    data = datastore.load_dataset(columns=training.feature_columns + [training.target_column])
+    best_model(data[training.feature_columns], data[training.target_column])
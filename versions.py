@@ -0,0 +1,161 @@
+import os
+import json
+import shutil
+from datetime import datetime
+
+from settings import load_config
+
+
+
+##################Load config.json and get path variables
+config = load_config()
+
+prod_deployment_path = os.path.join(config['prod_deployment_path'])
+versions_path = os.path.join(prod_deployment_path, 'versions')
+# The pointer to the version being served: {version, previous, switched}
+current_file = os.path.join(prod_deployment_path, 'current.json')
+# Versions kept after a deployment, besides the current and previous ones
+deployment_retention = config.get('deployment_retention', 5)
+# Files a deployment made before versioning left directly in the deployment folder
+legacy_files = ['trainedmodel.pkl', 'modelparams.json', 'latestscore.txt', 'ingestedfiles.txt',
+                'ingestedmanifest.json', 'referenceprofile.json', 'finaldata.csv']
+
+
+##################Pointer to the served version
+def load_pointer():
+    """Return the current deployment pointer, or None before the first versioned deployment."""
+    try:
+        with open(current_file, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def current_version():
+    pointer = load_pointer()
+    return pointer['version'] if pointer else None
+
+
+def version_path(version):
+    """Return the directory of a version; None stands for the flat pre-versioning layout."""
+    return os.path.join(versions_path, version) if version else prod_deployment_path
+
+
+def deployed_file(name, version=None):
+    """Return the path of a file of the given or the currently served deployment."""
+    return os.path.join(version_path(version or current_version()), name)
+
+
+def deployed_version():
+    """Return the id of the served version, or the pre-versioning stamp, or None before any deployment."""
+    version = current_version()
+    if version is not None:
+        return version
+    try:
+        with open(os.path.join(prod_deployment_path, 'modelversion.txt'), 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def switch_to(version):
+    """Serve version from now on, with one atomic rename of the pointer file.
+
+    Readers see either the old or the new pointer, and every file a
+    pointer names is complete, so a model is never paired with another
+    deployment's score or data.
+    """
+    if not os.path.isdir(version_path(version)):
+        raise ValueError(f"Unknown deployment version: {version}")
+    pointer = {'version': version, 'previous': current_version(), 'switched': datetime.now().isoformat()}
+    with open(current_file + '.tmp', 'w') as f:
+        json.dump(pointer, f, indent=2)
+    os.replace(current_file + '.tmp', current_file)
+    return pointer
+
+
+##################Immutable version directories
+def list_versions():
+    """Return the ids of all complete versions, oldest first."""
+    try:
+        return sorted(name for name in os.listdir(versions_path) if not name.startswith('.'))
+    except FileNotFoundError:
+        return []
+
+
+def new_version_dir(version=None):
+    """Return a new version id and a hidden staging directory to fill before publish()."""
+    version = version or datetime.now().strftime('%Y%m%d%H%M%S%f')
+    staging = os.path.join(versions_path, f'.{version}.tmp')
+    os.makedirs(staging)
+    return version, staging
+
+
+def publish(version, staging):
+    """Make a filled staging directory the complete, immutable directory of version."""
+    os.rename(staging, version_path(version))
+
+
+def rollback(version=None):
+    """Serve the previous version again, or the given one; only the pointer changes."""
+    pointer = load_pointer()
+    target = version or (pointer and pointer['previous'])
+    if target is None:
+        raise ValueError("No previous deployment version to roll back to")
+    pointer = switch_to(target)
+    print(f"Serving deployment version {target} (was {pointer['previous']})")
+    return pointer
+
+
+def migrate_legacy():
+    """Turn a deployment made before versioning into the first version and serve it.
+
+    The flat files are copied into a version named after their
+    modelversion.txt stamp, and removed only after the pointer switched,
+    so readers find the deployment throughout.
+    """
+    if os.path.exists(current_file) or not os.path.exists(os.path.join(prod_deployment_path, 'trainedmodel.pkl')):
+        return None
+    stamp_file = os.path.join(prod_deployment_path, 'modelversion.txt')
+    try:
+        with open(stamp_file, 'r') as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        mtime = os.path.getmtime(os.path.join(prod_deployment_path, 'trainedmodel.pkl'))
+        version = datetime.fromtimestamp(mtime).strftime('%Y%m%d%H%M%S%f')
+
+    os.makedirs(versions_path, exist_ok=True)
+    version, staging = new_version_dir(version)
+    present = [name for name in legacy_files if os.path.exists(os.path.join(prod_deployment_path, name))]
+    for name in present:
+        shutil.copy2(os.path.join(prod_deployment_path, name), os.path.join(staging, name))
+    publish(version, staging)
+    switch_to(version)
+
+    for name in present + ['modelversion.txt']:
+        if os.path.exists(os.path.join(prod_deployment_path, name)):
+            os.remove(os.path.join(prod_deployment_path, name))
+    print(f"Moved the existing deployment to version {version}")
+    return version
+
+
+def prune(keep=deployment_retention):
+    """Delete the oldest versions beyond keep, never the current or previous one."""
+    pointer = load_pointer() or {}
+    protected = {pointer.get('version'), pointer.get('previous')}
+    removable = [version for version in list_versions() if version not in protected]
+    for version in removable[:max(len(removable) - keep, 0)]:
+        shutil.rmtree(version_path(version))
+        print(f"Removed deployment version {version}")
+
+
+if __name__ == '__main__':
+    import sys
+    # python versions.py [list | rollback [version]]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'rollback':
+        rollback(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        served = current_version()
+        for version in list_versions():
+            print(f"{'*' if version == served else ' '} {version}")